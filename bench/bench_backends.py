@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Compare the socket backends of zerorpc.Context: the builtin gevent_zmq
+# against pyzmq's zmq.green, over a range of payload sizes.
+#
+#   python bench/bench_backends.py [count] [concurrency]
+#
+# For every backend and size, "latency" makes echo calls one after the other
+# and "throughput" makes them from concurrency greenlets at once. The number
+# of calls shrinks with the payload to keep each run short.
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import gevent
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zerorpc  # noqa
+
+SIZES = (16, 1024, 64 * 1024, 1024 * 1024)
+
+
+def bench(backend, endpoint, size, count, concurrency):
+    contexts = (zerorpc.Context(), zerorpc.Context())
+    for context in contexts:
+        context.socket_backend = backend
+    server = zerorpc.Server({'echo': lambda x: x},
+            context=contexts[0], heartbeat=None)
+    server.bind(endpoint)
+    server_task = gevent.spawn(server.run)
+    client = zerorpc.Client(context=contexts[1], heartbeat=None)
+    client.connect(endpoint)
+    payload = b'x' * size
+    client.echo(payload)
+
+    start = time.time()
+    for _ in range(count):
+        client.echo(payload)
+    usec = (time.time() - start) / count * 1e6
+
+    def worker(n):
+        for _ in range(n):
+            client.echo(payload)
+    start = time.time()
+    gevent.joinall([gevent.spawn(worker, max(count // concurrency, 1))
+        for _ in range(concurrency)], raise_error=True)
+    rate = max(count // concurrency, 1) * concurrency / (time.time() - start)
+
+    print('{0:>10} {1:>8}: latency {2:>8.1f} us  throughput {3:>7.0f} calls/s '
+          '{4:>8.1f} MiB/s'.format(backend, size, usec, rate,
+              rate * size / (1 << 20)))
+    client.close()
+    server_task.kill()
+    server.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    endpoint = 'ipc:///tmp/zerorpc_bench_backends_{0}'.format(os.getpid())
+    for size in SIZES:
+        n = max(count * 1024 // max(size, 1024), concurrency)
+        for backend in (u'gevent_zmq', u'green'):
+            bench(backend, endpoint, size, n, concurrency)
+
+
+if __name__ == '__main__':
+    main()
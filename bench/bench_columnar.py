@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Size and decoding time of a list of records, as a list of dicts and as
+# zerorpc.Columnar.
+#
+#   python bench/bench_columnar.py [rows]
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zerorpc  # noqa
+from zerorpc.events import pack_args  # noqa
+
+
+def bench(label, context, args, count=20):
+    (blob, frames) = pack_args(args, context)
+    start = time.time()
+    for _ in range(count):
+        pack_args(args, context)
+    packed = (time.time() - start) / count
+    start = time.time()
+    for _ in range(count):
+        zerorpc.unpack_args(blob, (), context)
+    unpacked = (time.time() - start) / count
+    start = time.time()
+    for _ in range(count):
+        rows = zerorpc.unpack_args(blob, (), context)[0]
+        for row in rows:
+            row[u'name']
+    iterated = (time.time() - start) / count
+    print('{0:>14} {1:>10} bytes  pack: {2:>7.1f} ms  unpack: {3:>7.1f} ms'
+          '  unpack+read: {4:>7.1f} ms'.format(label, len(blob),
+              packed * 1000, unpacked * 1000, iterated * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = [{u'id': i, u'name': u'row {0}'.format(i), u'score': i * 0.5,
+             u'active': bool(i % 2)} for i in range(count)]
+    context = zerorpc.Context()
+    bench('dicts', context, (rows,))
+    zerorpc.register_columnar(context)
+    bench('columnar', context, (zerorpc.Columnar(rows),))
+    lazy_context = zerorpc.Context()
+    zerorpc.register_columnar(lazy_context, lazy=True)
+    bench('columnar lazy', lazy_context, (zerorpc.Columnar(rows),))
+
+
+if __name__ == '__main__':
+    main()
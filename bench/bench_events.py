@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Microbenchmark of the Event (de)serialization path.
+#
+#   python bench/bench_events.py [count]
+#
+# "legacy" builds a new msgpack.Packer per event and feeds the frame buffer
+# into a new msgpack.Unpacker, as Event did before this change. "current" goes
+# through Events' reusable packer and Event.unpack(), decoding the args.
+# "route" only reads what ChannelMultiplexer needs to route an event.
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import msgpack
+import zmq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zerorpc  # noqa
+from zerorpc.events import get_pyzmq_frame_buffer  # noqa
+
+
+def legacy_pack(event):
+    return msgpack.Packer(use_bin_type=True).pack(
+        (event.header, event.name, event.args))
+
+
+def legacy_unpack(blob):
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(blob)
+    return unpacker.unpack()
+
+
+def bench(label, count, pack, unpack, event):
+    frame = zmq.Frame(pack(event))
+    start = time.time()
+    for _ in range(count):
+        pack(event)
+    packed = time.time() - start
+    start = time.time()
+    for _ in range(count):
+        unpack(get_pyzmq_frame_buffer(frame))
+    unpacked = time.time() - start
+    print('{0:>8} {1:>10}  pack: {2:>10.0f} events/s  unpack: {3:>10.0f} events/s'.format(
+        label, len(frame.bytes), count / packed, count / unpacked))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    context = zerorpc.Context()
+    packer = msgpack.Packer(use_bin_type=True)
+    payloads = [
+        ('small', (42, u'hello')),
+        ('medium', ([{u'id': i, u'name': u'row'} for i in range(32)],)),
+        ('large', (b'x' * (1 << 20),)),
+    ]
+    for name, args in payloads:
+        event = zerorpc.Event(u'method', args, context)
+        n = count if name != 'large' else max(count // 100, 1)
+        print(name)
+        bench('legacy', n, legacy_pack, legacy_unpack, event)
+        bench('current', n, lambda e: e.pack(packer),
+              lambda b: zerorpc.Event.unpack(b).args, event)
+        bench('route', n, lambda e: e.pack(packer),
+              lambda b: zerorpc.Event.unpack(b).header, event)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Bytes on the wire and calls per second of small RPCs, protocol v3 vs v4.
+#
+#   python bench/bench_protocol.py [count]
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import gevent
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zerorpc  # noqa
+
+
+class CountingSender(object):
+
+    def __init__(self, send):
+        self._send = send
+        self.bytes = 0
+
+    def __call__(self, parts, timeout=None):
+        self.bytes += sum(len(p) for p in parts)
+        return self._send(parts, timeout)
+
+
+def bench(label, endpoint, count, compact):
+    server_context = zerorpc.Context()
+    server = zerorpc.Server({'add': lambda a, b: a + b},
+            context=server_context, heartbeat=None)
+    server.bind(endpoint)
+    server_task = gevent.spawn(server.run)
+
+    client_context = zerorpc.Context()
+    client_context.compact_protocol = compact
+    client = zerorpc.Client(context=client_context, heartbeat=None)
+    client.connect(endpoint)
+    client.add(0, 0)  # negotiation
+
+    counters = []
+    for events in (client._events, server._events):
+        events._send = CountingSender(events._send)
+        counters.append(events._send)
+
+    start = time.time()
+    for i in range(count):
+        client.add(i, i)
+    elapsed = time.time() - start
+    sent = sum(c.bytes for c in counters)
+    print('{0}: {1:>6.1f} bytes/call  {2:>8.0f} calls/s'.format(
+        label, float(sent) / count, count / elapsed))
+    client.close()
+    server_task.kill()
+    server.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    bench('v3', 'ipc:///tmp/zerorpc_bench_v3', count, False)
+    bench('v4', 'ipc:///tmp/zerorpc_bench_v4', count, True)
+
+
+if __name__ == '__main__':
+    main()
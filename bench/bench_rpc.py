@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Latency and throughput of small events and RPCs, with and without the
+# direct send of events.Sender.
+#
+#   python bench/bench_rpc.py [count] [concurrency]
+#
+# "echo" is the round trip of an event between a DEALER and a ROUTER, "burst"
+# pushes count events in a row through PUSH/PULL. For RPCs, "latency" makes
+# the calls one after the other, "throughput" makes them from concurrency
+# greenlets at once, "bundled" with Context.bundle_events on both ends. "inproc"
+# and "local" share a context and an inproc endpoint, "local" with
+# Context.local_calls.
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import gevent
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zerorpc  # noqa
+from zerorpc import zmq  # noqa
+from zerorpc.events import Sender  # noqa
+
+
+def bench_events(label, endpoint, count):
+    server = zerorpc.Events(zmq.ROUTER)
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.DEALER)
+    client.connect(endpoint)
+
+    def echo():
+        while True:
+            event = server.recv()
+            reply = server.new_event(u'echo', event.args)
+            reply.identity = event.identity
+            server.emit_event(reply)
+    echo_task = gevent.spawn(echo)
+    client.emit(u'echo', (0,))
+    client.recv()
+    start = time.time()
+    for i in range(count):
+        client.emit(u'echo', (i,))
+        client.recv()
+    usec = (time.time() - start) / count * 1e6
+    echo_task.kill()
+    server.close()
+    client.close()
+
+    puller = zerorpc.Events(zmq.PULL)
+    puller.bind(endpoint)
+    pusher = zerorpc.Events(zmq.PUSH)
+    pusher.connect(endpoint)
+    pusher.emit(u'burst', (0,))
+    puller.recv()
+    start = time.time()
+    receiver = gevent.spawn(lambda: [puller.recv() for _ in range(count)])
+    for i in range(count):
+        pusher.emit(u'burst', (i,))
+    receiver.get()
+    rate = count / (time.time() - start)
+    puller.close()
+    pusher.close()
+    print('{0:>8}: echo {1:>7.1f} us  burst {2:>8.0f} events/s'.format(
+        label, usec, rate))
+
+
+def latency(client, count):
+    start = time.time()
+    for i in range(count):
+        client.add(i, i)
+    elapsed = time.time() - start
+    return (elapsed / count * 1e6, count / elapsed)
+
+
+def throughput(client, count, concurrency):
+    def worker(n):
+        for i in range(n):
+            client.add(i, i)
+    start = time.time()
+    gevent.joinall([gevent.spawn(worker, count // concurrency)
+        for _ in range(concurrency)], raise_error=True)
+    return count / (time.time() - start)
+
+
+def bench_rpc(label, endpoint, count, concurrency, bundle=False,
+        local=None):
+    if local is None:
+        contexts = (zerorpc.Context(), zerorpc.Context())
+    else:
+        contexts = (zerorpc.Context(),) * 2
+        contexts[0].local_calls = local
+    for context in contexts:
+        context.bundle_events = bundle
+    server = zerorpc.Server({'add': lambda a, b: a + b},
+            context=contexts[0], heartbeat=None)
+    server.bind(endpoint)
+    server_task = gevent.spawn(server.run)
+    client = zerorpc.Client(context=contexts[1], heartbeat=None)
+    client.connect(endpoint)
+    client.add(0, 0)
+
+    (usec, rate) = latency(client, count)
+    concurrent_rate = throughput(client, count, concurrency)
+    print('{0:>8}: latency {1:>7.1f} us ({2:>7.0f} calls/s)  '
+          'throughput {3:>7.0f} calls/s'.format(label, usec, rate,
+              concurrent_rate))
+    client.close()
+    server_task.kill()
+    server.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    endpoint = 'ipc:///tmp/zerorpc_bench_rpc_{0}'.format(os.getpid())
+    for bench in (bench_events, bench_rpc):
+        for direct in (False, True):
+            Sender.direct_send = direct
+            args = (count, concurrency) if bench is bench_rpc else (count,)
+            bench('direct' if direct else 'queued', endpoint, *args)
+    bench_rpc('bundled', endpoint, count, concurrency, bundle=True)
+    endpoint = 'inproc://zerorpc_bench_rpc'
+    bench_rpc('inproc', endpoint, count, concurrency, local=False)
+    bench_rpc('local', endpoint, count, concurrency, local=True)
+
+
+if __name__ == '__main__':
+    main()
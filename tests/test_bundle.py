@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+
+import gevent
+
+import zerorpc
+from .testutils import (teardown, random_ipc_endpoint, dealer_router,
+        new_context)
+
+
+def test_bundle_negotiation():
+    (server, client, identity) = dealer_router('bundle_events', True, True)
+    for i in range(10):
+        client.emit(u'myevent', (i,))
+    received = [server.recv() for i in range(10)]
+    assert [e.args[0] for e in received] == list(range(10))
+    assert all(e.name == u'myevent' for e in received)
+    assert server._recv.messages == 1
+
+    for i in range(10):
+        reply = server.new_event(u'reply', (i,))
+        reply.identity = received[i].identity
+        server.emit_event(reply)
+    assert [client.recv().args[0] for i in range(10)] == list(range(10))
+    assert client._recv.messages == 1
+    server.close()
+    client.close()
+
+
+def test_bundle_disabled_on_one_end():
+    for (server_bundles, client_bundles) in ((True, False), (False, True)):
+        (server, client, identity) = dealer_router('bundle_events',
+                server_bundles, client_bundles)
+        for i in range(10):
+            client.emit(u'myevent', (i,))
+        assert [server.recv().args[0] for i in range(10)] == list(range(10))
+        assert server._recv.messages == 10
+        for i in range(10):
+            reply = server.new_event(u'reply', (i,))
+            reply.identity = identity
+            server.emit_event(reply)
+        assert [client.recv().args[0] for i in range(10)] == list(range(10))
+        assert client._recv.messages == 10
+        server.close()
+        client.close()
+
+
+def test_bundle_keeps_order_and_size():
+    (server, client, identity) = dealer_router('bundle_events', True, True)
+    client.context.bundle_size = 1000
+    client.emit(u'small', (0,))
+    client.emit(u'large', (b'x' * 2000,))  # flushes the pending bundle
+    for i in range(1, 100):
+        client.emit(u'small', (i, b'y' * 50))
+    events = [server.recv() for i in range(100)]
+    assert [e.name for e in events] == [u'small', u'large'] + [u'small'] * 98
+    assert [e.args[0] for e in events[2:]] == list(range(1, 99))
+    assert server.recv().args[0] == 99
+    # 1 + 1 + about 100 * 60 / 1000 messages.
+    assert server._recv.messages < 12
+    server.close()
+    client.close()
+
+
+def test_bundle_window():
+    (server, client, identity) = dealer_router('bundle_events', True, True)
+    client.context.bundle_window = 0.05
+
+    def emitter():
+        for i in range(5):
+            client.emit(u'myevent', (i,))
+            gevent.sleep(0.001)
+    gevent.spawn(emitter)
+    assert [server.recv().args[0] for i in range(5)] == list(range(5))
+    assert server._recv.messages == 1
+    server.close()
+    client.close()
+
+
+def test_bundle_client_server():
+    endpoint = random_ipc_endpoint()
+    srv = zerorpc.Server({u'add': lambda a, b: a + b},
+            context=new_context(bundle_events=True))
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=new_context(bundle_events=True))
+    client.connect(endpoint)
+    assert client.add(1, 2) == 3
+    # joinall() returns the greenlets in the order they complete.
+    tasks = [gevent.spawn(client.add, i, i) for i in range(100)]
+    gevent.joinall(tasks, raise_error=True)
+    assert [task.value for task in tasks] == [i * 2 for i in range(100)]
+    client.close()
+    srv.close()
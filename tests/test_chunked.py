@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+
+import gevent
+
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+def chunked_server(context):
+    class MySrv(zerorpc.Server):
+
+        def echo(self, value):
+            return value
+
+        def blob(self, size):
+            return b'x' * size
+
+    srv = MySrv(context=context)
+    endpoint = random_ipc_endpoint()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+    return (srv, endpoint)
+
+
+def test_pack_args():
+    args = ([1, u'a', b'b'], {u'k': None})
+    (blob, frames) = zerorpc.pack_args(args)
+    assert frames == []
+    assert zerorpc.unpack_args(blob) == [[1, u'a', b'b'], {u'k': None}]
+
+
+def test_chunked_result():
+    context = zerorpc.Context()
+    context.chunk_size = 1024
+    (srv, endpoint) = chunked_server(context)
+
+    transfers = []
+    recv_chunked = zerorpc.patterns.ReqRep._recv_chunked
+
+    def counting_recv_chunked(self, context, channel, rep_event):
+        transfers.append(rep_event.args[0])
+        return recv_chunked(self, context, channel, rep_event)
+    zerorpc.patterns.ReqRep._recv_chunked = counting_recv_chunked
+    try:
+        client = zerorpc.Client(context=zerorpc.Context())
+        client.connect(endpoint)
+        value = [u'some text {0}'.format(i) for i in range(1000)]
+        assert client.echo(value) == value
+        assert client.blob(300 * 1024) == b'x' * 300 * 1024
+        assert client.echo(u'small') == u'small'
+    finally:
+        zerorpc.patterns.ReqRep._recv_chunked = recv_chunked
+    assert len(transfers) == 2
+    assert transfers[1] > 300 * 1024
+    client.close()
+    srv.close()
+
+
+def test_chunked_result_is_flow_controlled():
+    context = zerorpc.Context()
+    context.chunk_size = 64
+    (srv, endpoint) = chunked_server(context)
+
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    # More chunks than the client lets the server send at once.
+    size = 64 * 1000
+    result = client(u'blob', size, slots=10, **{'async': True})
+    assert client.echo(u'meanwhile') == u'meanwhile'
+    assert result.get() == b'x' * size
+    client.close()
+    srv.close()
+
+
+def test_chunked_result_not_requested():
+    context = zerorpc.Context()
+    context.chunk_size = 1024
+    (srv, endpoint) = chunked_server(context)
+
+    class NoChunks(object):
+
+        def client_before_request(self, event):
+            del event.header[u'chunked']
+
+    client_context = zerorpc.Context()
+    client_context.register_middleware(NoChunks())
+    client = zerorpc.Client(context=client_context)
+    client.connect(endpoint)
+    assert client.blob(10000) == b'x' * 10000
+    client.close()
+    srv.close()
+
+
+def test_chunked_result_disabled():
+    context = zerorpc.Context()
+    context.chunk_size = None
+    (srv, endpoint) = chunked_server(context)
+
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    assert client.blob(10000) == b'x' * 10000
+    client.close()
+    srv.close()
+
+
+def lazy_server(context):
+    class MySrv(zerorpc.Server):
+
+        def rows(self, count):
+            rows = ({u'id': i, u'name': u'row {0}'.format(i)}
+                    for i in range(count))
+            return zerorpc.LazyList(rows, count)
+
+        def short_rows(self, count):
+            return zerorpc.LazyList(iter(range(count - 1)), count)
+
+    srv = MySrv(context=context)
+    endpoint = random_ipc_endpoint()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+    return (srv, endpoint)
+
+
+def test_lazy_list():
+    context = zerorpc.Context()
+    context.chunk_size = 1024
+    (srv, endpoint) = lazy_server(context)
+
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    for count in (0, 1, 10000):
+        rows = client.rows(count)
+        assert isinstance(rows, list)
+        assert rows == [{u'id': i, u'name': u'row {0}'.format(i)}
+                for i in range(count)]
+    client.close()
+    srv.close()
+
+
+def test_lazy_list_wrong_length():
+    context = zerorpc.Context()
+    context.chunk_size = 1024
+    (srv, endpoint) = lazy_server(context)
+
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    for count in (1, 10000):
+        try:
+            client.short_rows(count)
+        except zerorpc.RemoteError as e:
+            assert e.name == 'ValueError'
+        else:
+            assert False, 'should have raised'
+    client.close()
+    srv.close()
+
+
+def test_lazy_list_chunks_disabled():
+    context = zerorpc.Context()
+    context.chunk_size = None
+    (srv, endpoint) = lazy_server(context)
+
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    assert client.rows(3) == [{u'id': i, u'name': u'row {0}'.format(i)}
+            for i in range(3)]
+    client.close()
+    srv.close()
+
+
+def test_chunked_result_oob_frames():
+    context = zerorpc.Context()
+    context.oob_threshold = 1000
+    context.chunk_size = 64 * 1024
+    (srv, endpoint) = chunked_server(context)
+
+    client_context = zerorpc.Context()
+    client_context.oob_threshold = 1000
+    client = zerorpc.Client(context=client_context)
+    client.connect(endpoint)
+    for size in (10, 32 * 1024, 100 * 1024):
+        result = client.blob(size)
+        # Sent out-of-band in one message or in chunks alike.
+        assert isinstance(result, memoryview if size >= 1000 else bytes)
+        assert result == b'x' * size
+    client.close()
+    srv.close()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import print_function, absolute_import
+import json
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+def json_codec_context():
+    context = zerorpc.Context()
+    context.register_serializer(u'json',
+            lambda args: json.dumps(args).encode('utf-8'),
+            lambda blob: json.loads(bytes(blob).decode('utf-8')))
+    return context
+
+
+def test_register_serializer():
+    context = json_codec_context()
+    assert context.serializers == [u'json', u'msgpack']
+    assert context.get_serializer(u'msgpack') == (None, None)
+    encode, decode = context.get_serializer(u'json')
+    assert decode(encode([1, u'a'])) == [1, u'a']
+
+
+def test_events_codec_negotiation():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.ROUTER, context=json_codec_context())
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.DEALER, context=json_codec_context())
+    client.connect(endpoint)
+
+    for i in range(3):
+        client.emit(u'myevent', (i,))
+        event = server.recv()
+        if i == 0:
+            # The first event is in msgpack and advertises our codecs.
+            assert event.header[u'codecs'] == [u'json', u'msgpack']
+            assert u'codec' not in event.header
+        else:
+            assert u'codecs' not in event.header
+            assert event.header[u'codec'] == u'json'
+        assert list(event.args) == [i]
+
+        reply_event = server.new_event(u'answer', (i * 2,))
+        reply_event.identity = event.identity
+        server.emit_event(reply_event)
+        event = client.recv()
+        assert event.header[u'codec'] == u'json'
+        assert list(event.args) == [i * 2]
+
+
+def test_codec_with_msgpack_only_server():
+    endpoint = random_ipc_endpoint()
+    srv = zerorpc.Server({'add': lambda a, b: a + b}, context=zerorpc.Context())
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=json_codec_context())
+    client.connect(endpoint)
+    for i in range(3):
+        assert client.add(i, 1) == i + 1
+    client.close()
+    srv.close()
+
+
+def test_codec_client_server():
+    endpoint = random_ipc_endpoint()
+    srv = zerorpc.Server({'echo': lambda x: x}, context=json_codec_context())
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=json_codec_context())
+    client.connect(endpoint)
+    for i in range(3):
+        assert client.echo({u'i': i}) == {u'i': i}
+    client.close()
+    srv.close()
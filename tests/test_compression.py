@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+
+import os
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from zerorpc.compression import compress, decompress
+from .testutils import teardown, random_ipc_endpoint
+
+
+def test_compress_roundtrip():
+    blob = b'hello world ' * 100
+    assert decompress(compress(blob)) == blob
+    zdict = b'hello world '
+    compressed = compress(blob, zdict)
+    assert decompress(compressed, zdict) == blob
+
+
+def test_train_compression_dictionary():
+    samples = [(u'{"user": %d, "status": "active", "region": "eu-west"}' % i)
+            .encode('utf-8') for i in range(50)]
+    zdict = zerorpc.train_compression_dictionary(samples, size=256,
+            segment=8)
+    assert 0 < len(zdict) <= 256
+    sample = samples[7]
+    assert len(compress(sample, zdict)) < len(compress(sample))
+    assert decompress(compress(sample, zdict), zdict) == sample
+
+
+def test_events_compression_threshold():
+    endpoint = random_ipc_endpoint()
+    context = zerorpc.Context()
+    context.compress_threshold = 256
+    server = zerorpc.Events(zmq.PULL, context=context)
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.PUSH, context=context)
+    client.connect(endpoint)
+
+    client.emit(u'small', (u'abc',))
+    event = server.recv()
+    assert u'compression' not in event.header
+    assert list(event.args) == [u'abc']
+
+    payload = u'abcd' * 1000
+    client.emit(u'large', (payload,))
+    event = server.recv()
+    assert event.header[u'compression'] == u'zlib'
+    assert u'zdict' not in event.header
+    assert list(event.args) == [payload]
+
+    # Incompressible data is sent as is.
+    noise = os.urandom(1024)
+    client.emit(u'noise', (noise,))
+    event = server.recv()
+    assert u'compression' not in event.header
+    assert list(event.args) == [noise]
+
+
+def test_events_compression_dictionary():
+    endpoint = random_ipc_endpoint()
+    context = zerorpc.Context()
+    samples = [zerorpc.Event(u'e', ({u'row': i, u'label': u'item'},),
+        context).pack() for i in range(20)]
+    zdict = zerorpc.train_compression_dictionary(samples, segment=4)
+
+    context.compress_threshold = 16
+    context.register_compression_dictionary(1, zdict)
+    context.compression_dictionary = 1
+    server = zerorpc.Events(zmq.PULL, context=context)
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.PUSH, context=context)
+    client.connect(endpoint)
+
+    args = ([{u'row': i, u'label': u'item'} for i in range(10)],)
+    client.emit(u'rows', args)
+    event = server.recv()
+    assert event.header[u'compression'] == u'zlib'
+    assert event.header[u'zdict'] == 1
+    assert list(event.args) == list(args)
+
+    # Without the dictionary, the event can't be decoded.
+    blob = zerorpc.Event(u'rows', args, context).pack(
+            compress=client._compress)
+    try:
+        zerorpc.Event.unpack(blob, zerorpc.Context())
+    except Exception as e:
+        assert 'unknown compression dictionary' in str(e)
+    else:
+        assert False, 'should have raised'
+
+
+def test_unknown_compression_dictionary_id():
+    context = zerorpc.Context()
+    try:
+        context.compression_dictionary = 42
+    except KeyError:
+        pass
+    else:
+        assert False, 'should have raised'
+
+
+def test_client_server_compression():
+    endpoint = random_ipc_endpoint()
+    context = zerorpc.Context()
+    context.compress_threshold = 128
+
+    class MySrv(zerorpc.Server):
+
+        def echo(self, value):
+            return value
+
+    srv = MySrv(context=context)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=context)
+    client.connect(endpoint)
+    value = [u'some text'] * 200
+    assert client.echo(value) == value
+    assert client.echo(u'x') == u'x'
+    client.close()
+    srv.close()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+import datetime
+import decimal
+import uuid
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+try:
+    import dataclasses
+except ImportError:
+    dataclasses = None
+
+if dataclasses is not None:
+    Point = dataclasses.make_dataclass('Point',
+            [('x', int), ('y', int), ('label', str)], frozen=True)
+
+
+class Node(object):
+    __slots__ = ['value', 'children']
+
+    def __init__(self, value, children=()):
+        self.value = value
+        self.children = list(children)
+
+    def __eq__(self, other):
+        return (self.value, self.children) == (other.value, other.children)
+
+
+class TaggedNode(Node):
+    __slots__ = ['tag']
+
+
+def types_context():
+    context = zerorpc.Context()
+    zerorpc.register_standard_types(context)
+    zerorpc.register_record_type(context, Node, 16)
+    zerorpc.register_record_type(context, TaggedNode, 17)
+    if dataclasses is not None:
+        zerorpc.register_record_type(context, Point, 18)
+    return context
+
+
+def roundtrip(args):
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.PULL, context=types_context())
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.PUSH, context=types_context())
+    client.connect(endpoint)
+    client.emit(u'myevent', args)
+    event = server.recv()
+    client.close()
+    server.close()
+    return event.args
+
+
+def test_standard_types():
+    utc_offset = datetime.timezone(datetime.timedelta(hours=-5, minutes=-30))
+    values = [
+        datetime.datetime(2020, 2, 29, 23, 59, 58, 123456),
+        datetime.datetime(1900, 1, 1),
+        datetime.datetime(2020, 2, 29, 23, 59, 58, 1, tzinfo=utc_offset),
+        datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+        decimal.Decimal('3.14159265358979323846264338327950288'),
+        decimal.Decimal('-1E+30'),
+        uuid.uuid4(),
+    ]
+    received = roundtrip((values,))[0]
+    for (value, other) in zip(values, received):
+        assert type(value) is type(other)
+        assert value == other
+        if isinstance(value, datetime.datetime):
+            assert value.utcoffset() == other.utcoffset()
+
+
+def test_slots_record():
+    tree = Node(1, [Node(2), Node(3, [Node(4)])])
+    tagged = TaggedNode(5)
+    tagged.tag = uuid.uuid4()
+    (received_tree, received_tagged) = roundtrip((tree, tagged))
+    assert isinstance(received_tree, Node)
+    assert received_tree == tree
+    assert isinstance(received_tagged, TaggedNode)
+    assert received_tagged.value == 5
+    assert received_tagged.tag == tagged.tag
+
+
+def test_record_fields():
+    try:
+        zerorpc.register_record_type(zerorpc.Context(), object, 16)
+    except ValueError:
+        pass
+    else:
+        assert False, 'should have raised'
+
+
+def test_dataclass_record():
+    if dataclasses is None:
+        return
+    points = [Point(i, -i, u'p{0}'.format(i)) for i in range(3)]
+    assert roundtrip((points,))[0] == points
+
+
+def test_record_client_server():
+    endpoint = random_ipc_endpoint()
+
+    class MySrv(zerorpc.Server):
+
+        def grow(self, node):
+            node.children.append(Node(datetime.datetime(2000, 1, 1)))
+            return node
+
+    srv = MySrv(context=types_context())
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=types_context())
+    client.connect(endpoint)
+    node = client.grow(Node(decimal.Decimal('1.5')))
+    assert node == Node(decimal.Decimal('1.5'),
+            [Node(datetime.datetime(2000, 1, 1))])
+    client.close()
+    srv.close()
+
+
+def test_columnar():
+    rows = [{u'id': i, u'name': u'row {0}'.format(i),
+             u'at': datetime.datetime(2000, 1, 1, i)} for i in range(10)]
+    for lazy in (False, True):
+        context = types_context()
+        zerorpc.register_columnar(context, lazy=lazy)
+        (blob, frames) = zerorpc.pack_args((zerorpc.Columnar(rows),),
+                context)
+        received = zerorpc.unpack_args(blob, frames, context)[0]
+        assert isinstance(received, zerorpc.ColumnarRows) == lazy
+        assert len(received) == len(rows)
+        assert received == rows
+        assert received[3] == rows[3]
+        assert received[-1] == rows[-1]
+        assert received[2:4] == rows[2:4]
+        if lazy:
+            assert received.columns[u'id'] == list(range(10))
+
+    context = zerorpc.Context()
+    zerorpc.register_columnar(context)
+    for rows in ([], [{}, {}]):
+        (blob, frames) = zerorpc.pack_args((zerorpc.Columnar(rows),),
+                context)
+        assert zerorpc.unpack_args(blob, frames, context)[0] == rows
+    try:
+        zerorpc.pack_args((zerorpc.Columnar([{u'a': 1}, {u'b': 2, u'c': 3}]),),
+                context)
+    except ValueError:
+        pass
+    else:
+        assert False, 'should have raised'
+
+
+def test_columnar_client_server():
+    endpoint = random_ipc_endpoint()
+    context = zerorpc.Context()
+    zerorpc.register_columnar(context)
+
+    class MySrv(zerorpc.Server):
+
+        def rows(self, count):
+            return zerorpc.Columnar([{u'id': i, u'even': not i % 2}
+                for i in range(count)])
+
+    srv = MySrv(context=context)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=context)
+    client.connect(endpoint)
+    assert client.rows(3) == [{u'id': 0, u'even': True},
+            {u'id': 1, u'even': False}, {u'id': 2, u'even': True}]
+    client.close()
+    srv.close()
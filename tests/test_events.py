@@ -27,8 +27,12 @@ from __future__ import print_function, absolute_import
 from builtins import str, bytes
 from builtins import range, object
 
+import gevent
+import msgpack
+
 from zerorpc import zmq
 import zerorpc
+from zerorpc.events import get_pyzmq_frame_buffer
 from .testutils import teardown, random_ipc_endpoint
 
 class MokupContext(object):
@@ -197,3 +201,302 @@ def test_msgpack():
     assert isinstance(event.header[u'message_id'], bytes)
     assert isinstance(event.header[u'v'], int)
     assert isinstance(event.args[0], str)
+
+
+def test_pack_reused_packer_and_unpack_buffer():
+    context = zerorpc.Context()
+    packer = msgpack.Packer(use_bin_type=True)
+    for i in range(3):
+        event = zerorpc.Event(u'myevent', (i, b'data'), context=context)
+        frame = zmq.Frame(event.pack(packer))
+        unpacked = zerorpc.Event.unpack(get_pyzmq_frame_buffer(frame))
+        assert unpacked.name == u'myevent'
+        assert unpacked.header[u'message_id'] == event.header[u'message_id']
+        assert list(unpacked.args) == [i, b'data']
+
+
+def test_pack_reused_packer_after_error():
+    context = zerorpc.Context()
+    packer = msgpack.Packer(use_bin_type=True)
+    event = zerorpc.Event(u'myevent', (object(),), context=context)
+    try:
+        event.pack(packer)
+    except TypeError:
+        pass
+    else:
+        assert False, 'an object() should not be serializable'
+    event = zerorpc.Event(u'myevent', (42,), context=context)
+    unpacked = zerorpc.Event.unpack(event.pack(packer))
+    assert unpacked.name == u'myevent'
+    assert list(unpacked.args) == [42]
+
+
+def test_unpack_ignores_trailing_data():
+    context = zerorpc.Context()
+    event = zerorpc.Event(u'myevent', (42,), context=context)
+    unpacked = zerorpc.Event.unpack(event.pack() + b'\xc0\xc0')
+    assert unpacked.name == u'myevent'
+    assert list(unpacked.args) == [42]
+
+
+def test_events_oob_frames():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.ROUTER)
+    server.bind(endpoint)
+
+    context = zerorpc.Context()
+    context.oob_threshold = 1024
+    client = zerorpc.Events(zmq.DEALER, context=context)
+    client.connect(endpoint)
+
+    big = b'x' * 4096
+    other = bytearray(b'y' * 2048)
+    client.emit('myevent', (big, b'small', {u'k': [other]}))
+    event = server.recv()
+    print(event)
+    assert event.header[u'frames'] == 2
+    (a, b, c) = event.args
+    assert isinstance(a, memoryview) and a.tobytes() == big
+    assert b == b'small'
+    assert c[u'k'][0].tobytes() == bytes(other)
+
+    # The identity must still be usable to reply.
+    reply_event = server.new_event('answer', (42,))
+    reply_event.identity = event.identity
+    server.emit_event(reply_event)
+    event = client.recv()
+    assert list(event.args) == [42]
+
+
+def test_events_oob_frames_push_pull():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.PULL)
+    server.bind(endpoint)
+
+    context = zerorpc.Context()
+    context.oob_threshold = 0
+    client = zerorpc.Events(zmq.PUSH, context=context)
+    client.connect(endpoint)
+
+    client.emit('myevent', (b'a', memoryview(b'bc'), 42))
+    event = server.recv()
+    assert event.header[u'frames'] == 2
+    assert event.identity is None
+    assert [bytes(x) for x in event.args[:2]] == [b'a', b'bc']
+    assert event.args[2] == 42
+
+
+def test_unpack_lazy_args():
+    context = zerorpc.Context()
+    event = zerorpc.Event(u'myevent', (u'a' * 1000, 42), context=context)
+    packed = event.pack()
+    # Corrupt the args, the header and the name must still be readable.
+    corrupted = packed[:-4] + b'\xc1\xc1\xc1\xc1'
+    unpacked = zerorpc.Event.unpack(corrupted)
+    assert unpacked.name == u'myevent'
+    assert unpacked.header[u'message_id'] == event.header[u'message_id']
+    try:
+        unpacked.args
+    except Exception:
+        pass
+    else:
+        assert False, 'the args should be undecodable'
+
+    unpacked = zerorpc.Event.unpack(packed)
+    assert list(unpacked.args) == [u'a' * 1000, 42]
+    assert unpacked.args is unpacked.args
+
+
+def test_unpack_large_header():
+    context = zerorpc.Context()
+    event = zerorpc.Event(u'myevent', (42,), context=context)
+    event.header[u'trace'] = u'x' * 10000
+    unpacked = zerorpc.Event.unpack(event.pack())
+    assert unpacked.header[u'trace'] == u'x' * 10000
+    assert list(unpacked.args) == [42]
+
+
+def test_unpack_invalid():
+    for blob in (msgpack.packb([1, 2]), msgpack.packb(42), b'\x93\x80'):
+        try:
+            zerorpc.Event.unpack(blob)
+        except Exception as e:
+            assert 'invalid msg format' in str(e)
+        else:
+            assert False, 'should have raised'
+
+
+def test_pack_compact_header():
+    context = zerorpc.Context()
+    event = zerorpc.Event(u'myevent', (42,), context=context)
+    event.header[u'response_to'] = context.new_msgid()
+    event.header[u'frames'] = 0
+    event.header[u'trace_id'] = u'abc'
+    packed = event.pack(compact=True)
+    assert len(packed) < len(event.pack())
+    unpacked = zerorpc.Event.unpack(packed)
+    assert unpacked.header == {
+        u'v': 4,
+        u'message_id': event.header[u'message_id'],
+        u'response_to': event.header[u'response_to'],
+        u'frames': 0,
+        u'trace_id': u'abc',
+    }
+    assert list(unpacked.args) == [42]
+
+
+def test_events_protocol_v4_negotiation():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.ROUTER)
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.DEALER)
+    client.connect(endpoint)
+
+    for i in range(3):
+        client.emit(u'myevent', (i,))
+        event = server.recv()
+        if i == 0:
+            assert event.header[u'v'] == 3
+            assert event.header[u'vmax'] == 4
+        else:
+            assert event.header[u'v'] == 4
+            assert u'vmax' not in event.header
+        assert list(event.args) == [i]
+
+        reply_event = server.new_event(u'answer', (i,))
+        reply_event.identity = event.identity
+        server.emit_event(reply_event)
+        event = client.recv()
+        assert event.header[u'v'] == 4
+        assert list(event.args) == [i]
+
+
+def test_events_protocol_v4_keeps_legacy_versions():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.ROUTER)
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.DEALER)
+    client.connect(endpoint)
+
+    client.emit(u'myevent', (0,))
+    event = server.recv()
+    reply_event = server.new_event(u'answer', (0,))
+    reply_event.identity = event.identity
+    server.emit_event(reply_event)
+    client.recv()
+
+    # v4 is negotiated, the events of older versions are still sent as such.
+    for v in (1, 2):
+        client.emit(u'myevent', (v,), xheader={u'v': v})
+        event = server.recv()
+        assert event.header[u'v'] == v
+        assert list(event.args) == [v]
+
+
+def test_events_protocol_v4_disabled():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.ROUTER)
+    server.bind(endpoint)
+    context = zerorpc.Context()
+    context.compact_protocol = False
+    client = zerorpc.Events(zmq.DEALER, context=context)
+    client.connect(endpoint)
+
+    for i in range(2):
+        client.emit(u'myevent', (i,))
+        event = server.recv()
+        assert event.header[u'v'] == 3
+        assert u'vmax' not in event.header
+
+        reply_event = server.new_event(u'answer', (i,))
+        reply_event.identity = event.identity
+        server.emit_event(reply_event)
+        event = client.recv()
+        assert event.header[u'v'] == 3
+
+
+def test_events_direct_send_keeps_order():
+    endpoint = random_ipc_endpoint()
+    pusher = zerorpc.Events(zmq.PUSH)
+    pusher.setsockopt(zmq.IMMEDIATE, 1)
+    pusher.connect(endpoint)
+
+    # Without any peer the direct send fails, events get queued, and the
+    # ones emitted meanwhile must not overtake them.
+    def sender(j):
+        for i in range(j * 10, j * 10 + 10):
+            pusher.emit(u'e', (i,))
+    senders = [gevent.spawn(sender, j) for j in range(3)]
+    gevent.sleep(0.1)
+    assert pusher._send._pending > 0
+
+    puller = zerorpc.Events(zmq.PULL)
+    puller.bind(endpoint)
+    received = [puller.recv().args[0] for _ in range(30)]
+    gevent.joinall(senders, raise_error=True)
+    for j in range(3):
+        mine = [i for i in received if j * 10 <= i < j * 10 + 10]
+        assert mine == list(range(j * 10, j * 10 + 10))
+    assert pusher._send._pending == 0
+
+    pusher.emit(u'e', (42,))
+    assert pusher._send._pending == 0
+    assert puller.recv().args[0] == 42
+    pusher.close()
+    puller.close()
+
+
+def test_events_receiver_drains_bursts():
+    endpoint = random_ipc_endpoint()
+    puller = zerorpc.Events(zmq.PULL)
+    puller.bind(endpoint)
+    pusher = zerorpc.Events(zmq.PUSH)
+    pusher.connect(endpoint)
+
+    for i in range(100):
+        pusher.emit(u'e', (i, b'x' * (i % 3)))
+    gevent.sleep(0.1)
+    # The receiver buffered the whole burst without waiting for a reader.
+    assert puller.recv().args[0] == 0
+    assert puller._recv._recv_queue.qsize() == 99
+    assert [puller.recv().args[0] for _ in range(99)] == list(range(1, 100))
+    pusher.close()
+    puller.close()
+
+
+def test_events_control_events_overtake_bulk():
+    endpoint = random_ipc_endpoint()
+    pusher = zerorpc.Events(zmq.PUSH)
+    pusher.setsockopt(zmq.SNDHWM, 1)
+    pusher.setsockopt(zmq.SNDBUF, 64 * 1024)
+    pusher.connect(endpoint)
+    puller = zerorpc.Events(zmq.PULL)
+    puller.setsockopt(zmq.RCVHWM, 1)
+    puller.setsockopt(zmq.RCVBUF, 64 * 1024)
+    puller._recv.close()    # nobody reads, the link saturates
+    puller.bind(endpoint)
+
+    payload = b'x' * (1024 * 1024)
+
+    def sender(j):
+        for i in range(j * 10, j * 10 + 10):
+            pusher.emit(u'bulk', (i, payload))
+    senders = [gevent.spawn(sender, j) for j in range(2)]
+    gevent.sleep(0.1)
+    assert pusher._send._pending > 1
+    # Without a priority lane, these would wait for the bulk events.
+    with gevent.Timeout(1):
+        pusher.emit(u'_zpc_hb', (0,))
+        pusher.emit(u'_zpc_more', (10,))
+
+    received = []
+    while len(received) < 22:
+        parts = puller._recv._recv()
+        received.append(zerorpc.Event.unpack(parts[-1]).name)
+    gevent.joinall(senders, raise_error=True)
+    # Only the events already handed over to zmq are ahead.
+    assert received.index(u'_zpc_hb') < 5
+    assert received.index(u'_zpc_more') == received.index(u'_zpc_hb') + 1
+    assert received.count(u'bulk') == 20
+    pusher.close()
+    puller.close()
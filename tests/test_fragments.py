@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import print_function, absolute_import
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from .testutils import (teardown, random_ipc_endpoint, dealer_router,
+        new_context)
+
+
+def test_fragments():
+    (server, client, identity) = dealer_router('fragment_size', 1000, 1000)
+    payload = bytes(bytearray(range(256))) * 40
+    client.emit(u'large', (payload, 1))
+    event = server.recv()
+    assert event.name == u'large'
+    assert list(event.args) == [payload, 1]
+    assert server._recv.messages == 11
+
+    reply = server.new_event(u'reply', (payload,))
+    reply.identity = event.identity
+    server.emit_event(reply)
+    client.emit(u'small', (2,))
+    assert client.recv().args[0] == payload
+    assert server.recv().args[0] == 2
+    assert client._recv.messages == 11
+    server.close()
+    client.close()
+
+
+def test_fragments_out_of_band_frames():
+    (server, client, identity) = dealer_router('fragment_size', 1000, 1000)
+    client.context.oob_threshold = 100
+    server.context.oob_threshold = 100
+    payload = b'y' * 3000
+    client.emit(u'large', (payload, b'z' * 10, payload + b'!'))
+    event = server.recv()
+    assert [bytes(a) for a in event.args] == [payload, b'z' * 10,
+                                             payload + b'!']
+    assert server._recv.messages > 6
+    server.close()
+    client.close()
+
+
+def test_fragments_disabled_on_one_end():
+    for (server_size, client_size) in ((1000, None), (None, 1000)):
+        (server, client, identity) = dealer_router('fragment_size',
+                server_size, client_size)
+        client.emit(u'large', (b'x' * 10000,))
+        assert server.recv().args[0] == b'x' * 10000
+        assert server._recv.messages == 1
+        server.close()
+        client.close()
+
+
+def test_sender_fair_queues():
+    endpoint = random_ipc_endpoint()
+    pusher = zerorpc.Events(zmq.PUSH)
+    pusher.setsockopt(zmq.IMMEDIATE, 1)
+    pusher.connect(endpoint)
+    sender = pusher._send
+
+    # Without any peer everything gets queued: ten large messages of one
+    # channel, then the small messages of other channels.
+    tasks = [gevent.spawn(sender, [b'bulk', b'x' * (100 * 1024)],
+        key=u'bulk') for _ in range(10)]
+    tasks.extend(gevent.spawn(sender, [b'small', b'y' * 10], key=i)
+        for i in range(5))
+    gevent.sleep(0.1)
+
+    puller = zmq.Context.instance().socket(zmq.PULL)
+    puller.bind(endpoint)
+    received = [puller.recv_multipart()[0] for _ in range(15)]
+    gevent.joinall(tasks, raise_error=True)
+    # The small messages don't wait for all the large ones.
+    assert received.count(b'small') == 5
+    assert len(received) - received[::-1].index(b'small') <= 5
+    assert sender._pending == 0
+    assert not sender._queues and not sender._active
+    puller.close()
+    pusher.close()
+
+
+def test_sender_timeout_cancels():
+    endpoint = random_ipc_endpoint()
+    pusher = zerorpc.Events(zmq.PUSH)
+    pusher.setsockopt(zmq.IMMEDIATE, 1)
+    pusher.connect(endpoint)
+    sender = pusher._send
+    first = gevent.spawn(sender, [b'first'])
+    gevent.sleep(0.05)
+    try:
+        sender([b'second'], timeout=0.05)
+        assert False
+    except zerorpc.TimeoutExpired:
+        pass
+    assert sender._pending == 1
+    assert not sender._queues
+    puller = zmq.Context.instance().socket(zmq.PULL)
+    puller.bind(endpoint)
+    assert puller.recv() == b'first'
+    first.get()
+    assert sender._pending == 0
+    puller.close()
+    pusher.close()
+
+
+def test_fragments_client_server():
+    endpoint = random_ipc_endpoint()
+    srv = zerorpc.Server({u'echo': lambda x: x},
+            context=new_context(fragment_size=64 * 1024))
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=new_context(fragment_size=64 * 1024))
+    client.connect(endpoint)
+    payload = b'x' * (1024 * 1024)
+    large = [gevent.spawn(client.echo, payload) for _ in range(3)]
+    small = [gevent.spawn(client.echo, i) for i in range(50)]
+    done = gevent.joinall(large + small, raise_error=True)
+    assert [r.value for r in large] == [payload] * 3
+    assert [r.value for r in small] == list(range(50))
+    # The small calls don't wait for the large ones to complete.
+    assert set(done[:50]) == set(small)
+    client.close()
+    srv.close()
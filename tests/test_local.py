@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import print_function, absolute_import
+import gevent
+
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+def local_context():
+    context = zerorpc.Context()
+    context.local_calls = True
+    return context
+
+
+def inproc_endpoint():
+    return random_ipc_endpoint().replace('ipc://', 'inproc://')
+
+
+class MySrv(zerorpc.Server):
+
+    def add(self, a, b):
+        return a + b
+
+    def echo(self, x):
+        return x
+
+    def raw(self):
+        return zerorpc.RawResult(b'\x92\x01\x02')
+
+    @zerorpc.stream
+    def range(self, n):
+        return range(n)
+
+    def boom(self):
+        raise ValueError('boom')
+
+    def slow(self):
+        gevent.sleep(10)
+
+
+def run_server(context, endpoint):
+    srv = MySrv(context=context)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+    return srv
+
+
+def test_local_calls():
+    context = local_context()
+    endpoint = inproc_endpoint()
+    srv = run_server(context, endpoint)
+    client = zerorpc.Client(endpoint, context=context)
+    assert client._local_events is not None
+
+    assert client.add(1, 2) == 3
+    # Handed over as is.
+    payload = (1, {u'a': [2]})
+    assert client.echo(payload) is payload
+    assert client.raw() == [1, 2]
+    assert list(client.range(5)) == list(range(5))
+    try:
+        client.boom()
+        assert False
+    except zerorpc.RemoteError as e:
+        assert e.name == 'ValueError'
+
+    client.disconnect(endpoint)
+    assert client._local_events is None
+    client.connect(endpoint)
+    assert client.add(2, 2) == 4
+    client.close()
+    srv.close()
+
+
+def test_local_calls_hooks():
+    context = local_context()
+    calls = []
+
+    class Tracer(object):
+
+        def server_before_exec(self, request_event):
+            calls.append(('server_before_exec', request_event.name))
+
+        def client_before_request(self, event):
+            calls.append(('client_before_request', event.name))
+
+        def client_after_request(self, req_event, rep_event, exception):
+            calls.append(('client_after_request', rep_event.name))
+
+        def get_task_context(self):
+            return {u'trace': 42}
+
+        def load_task_context(self, header):
+            calls.append(('load_task_context', header.get(u'trace')))
+
+    context.register_middleware(Tracer())
+    endpoint = inproc_endpoint()
+    srv = run_server(context, endpoint)
+    client = zerorpc.Client(endpoint, context=context)
+    assert client.add(1, 2) == 3
+    assert calls == [('client_before_request', u'add'),
+                     ('load_task_context', 42),
+                     ('server_before_exec', u'add'),
+                     ('client_after_request', u'OK')]
+    client.close()
+    srv.close()
+
+
+def test_local_calls_lost_remote():
+    context = local_context()
+    endpoint = inproc_endpoint()
+    srv = run_server(context, endpoint)
+    client = zerorpc.Client(endpoint, context=context)
+    task = gevent.spawn(client.slow)
+    gevent.sleep(0.1)
+    srv.close()
+    try:
+        task.get(timeout=1)
+        assert False
+    except zerorpc.LostRemote as e:
+        print('got that:', e)
+    client.close()
+
+
+def test_local_calls_disabled():
+    context = zerorpc.Context()
+    endpoint = inproc_endpoint()
+    srv = run_server(context, endpoint)
+    client = zerorpc.Client(endpoint, context=context)
+    assert client._local_events is None
+    payload = (1, 2)
+    assert client.echo(payload) == [1, 2]
+    client.close()
+    srv.close()
+
+
+def test_local_calls_other_context():
+    endpoint = inproc_endpoint()
+    context = local_context()
+    srv = run_server(context, endpoint)
+    client = zerorpc.Client(context=local_context())
+    client.connect(endpoint)
+    assert client._local_events is None
+    client.close()
+
+    # Only when connecting to a single server.
+    client = zerorpc.Client(context=context)
+    client.connect(random_ipc_endpoint())
+    client.connect(endpoint)
+    assert client._local_events is None
+    client.close()
+    srv.close()
+
+
+
+def test_local_calls_bind_after_run():
+    context = local_context()
+    srv = MySrv(context=context)
+    srv.bind(random_ipc_endpoint())
+    gevent.spawn(srv.run)
+    gevent.sleep(0)
+    endpoint = inproc_endpoint()
+    srv.bind(endpoint)
+    client = zerorpc.Client(endpoint, context=context)
+    assert client._local_events is not None
+    assert client.add(1, 2) == 3
+
+    # Stopped and run again.
+    srv.stop()
+    gevent.spawn(srv.run)
+    gevent.sleep(0)
+    assert client.add(2, 2) == 4
+    client.close()
+    srv.close()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+
+import gevent
+
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+class MySrv(zerorpc.Server):
+
+    def add(self, a, b):
+        return a + b
+
+    def a_rather_long_method_name_for_the_wire(self):
+        return u'long'
+
+
+def test_client_server_method_ids():
+    names = []
+
+    class Tracer(object):
+
+        def server_before_exec(self, request_event):
+            names.append(request_event.name)
+
+        def client_before_request(self, event):
+            names.append(event.name)
+
+    context = zerorpc.Context()
+    context.register_middleware(Tracer())
+    srv_context = zerorpc.Context()
+    srv_context.register_middleware(Tracer())
+    endpoint = random_ipc_endpoint()
+    srv = MySrv(context=srv_context)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=context, method_ids=True)
+    client.connect(endpoint)
+    assert client.add(1, 2) == 3
+    assert client._method_ids[u'add'] == srv._method_names.index(u'add')
+    assert client.add(3, 4) == 7
+    assert client(b'add', 5, 6) == 11
+    assert client.a_rather_long_method_name_for_the_wire() == u'long'
+    try:
+        client.unknown()
+    except zerorpc.RemoteError as e:
+        assert e.name == 'NameError'
+    else:
+        assert False, 'should have raised'
+    # The hooks see names, never ids.
+    assert not any(isinstance(name, int) for name in names)
+    client.close()
+    srv.close()
+
+
+def test_method_ids_are_sent():
+    endpoint = random_ipc_endpoint()
+    srv = MySrv()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(method_ids=True)
+    client.connect(endpoint)
+    received = []
+    recv = srv._multiplexer._events.recv
+
+    def spying_recv(*args, **kargs):
+        event = recv(*args, **kargs)
+        received.append(event.name)
+        return event
+    srv._multiplexer._events.recv = spying_recv
+    assert client.add(1, 2) == 3
+    assert client.add(1, 2) == 3
+    assert received[0] == u'_zerorpc_methods'
+    assert srv._method_names[received[-1]] == u'add'
+    client.close()
+    srv.close()
+
+
+def test_method_table_mismatch():
+    endpoint = random_ipc_endpoint()
+    srv = MySrv()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(method_ids=True)
+    client.connect(endpoint)
+    assert client.add(1, 2) == 3
+    client._method_table_crc += 1
+    # The server refuses the id, the client fetches the table and retries.
+    assert client.add(1, 2) == 3
+    assert client._method_table_crc == srv._method_table_crc
+    client.close()
+    srv.close()
+
+
+def test_method_table_mismatch_server():
+    endpoint = random_ipc_endpoint()
+    srv = MySrv()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+    client = zerorpc.Client(method_ids=True)
+    client.connect(endpoint)
+    client.add(1, 2)
+
+    event = client._events.new_event(u'add', (1, 2))
+    event.name = client._method_ids[u'add']
+    event.header[u'mtab'] = client._method_table_crc + 1
+    try:
+        srv._method_by_id(event)
+    except NameError as e:
+        assert isinstance(e, zerorpc.MethodTableMismatch)
+    else:
+        assert False, 'should have raised'
+    client.close()
+    srv.close()
+
+
+def test_method_table_server_restarted():
+    endpoint = random_ipc_endpoint()
+    srv = MySrv()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(method_ids=True)
+    client.connect(endpoint)
+    assert client.add(1, 2) == 3
+    old_crc = client._method_table_crc
+    old_id = client._method_ids[u'add']
+    srv.close()
+    gevent.sleep(0.2)  # the client notices, what it sends before is lost
+
+    class MyNewSrv(MySrv):
+
+        def aaa_first(self):
+            return u'first'
+
+    srv = MyNewSrv()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+    # add has another id on the new server.
+    assert client.add(1, 2) == 3
+    assert client._method_table_crc != old_crc
+    assert client.aaa_first() == u'first'
+    assert client._method_ids[u'add'] == old_id + 1
+    async_result = client('add', 2, 2, **{'async': True})
+    assert async_result.get() == 4
+    client.close()
+    srv.close()
+
+
+def test_method_ids_with_old_server():
+    endpoint = random_ipc_endpoint()
+    srv = zerorpc.Server({u'add': lambda a, b: a + b})
+    del srv._methods[u'_zerorpc_methods']
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(method_ids=True)
+    client.connect(endpoint)
+    assert client.add(1, 2) == 3
+    assert client._method_ids == {}
+    assert client.add(1, 2) == 3
+    client.close()
+    srv.close()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import print_function, absolute_import
+import time
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+def monitored_context():
+    context = zerorpc.Context()
+    context.monitor_peers = True
+    return context
+
+
+def test_client_lost_server():
+    endpoint = random_ipc_endpoint()
+
+    class MySrv(zerorpc.Server):
+
+        def slow(self):
+            gevent.sleep(10)
+
+    srv = MySrv(heartbeat=2, context=monitored_context())
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(heartbeat=2, context=monitored_context())
+    client.connect(endpoint)
+
+    task = gevent.spawn(client.slow)
+    gevent.sleep(0.3)
+    start = time.time()
+    srv.close()
+    try:
+        task.get(timeout=3)
+        assert False
+    except zerorpc.LostRemote as e:
+        print('got that:', e)
+    # Well before the 4s it takes to miss two heartbeats.
+    assert time.time() - start < 2
+    client.close()
+
+
+def test_server_lost_client():
+    endpoint = random_ipc_endpoint()
+    lost = gevent.event.Event()
+
+    class MySrv(zerorpc.Server):
+
+        def slow(self):
+            try:
+                gevent.sleep(10)
+            except zerorpc.LostRemote:
+                lost.set()
+                raise
+
+    srv = MySrv(heartbeat=2, context=monitored_context())
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(heartbeat=2, context=monitored_context())
+    client.connect(endpoint)
+    gevent.spawn(client.slow)
+    gevent.sleep(0.3)
+    start = time.time()
+    client.close()
+    assert lost.wait(timeout=3)
+    assert time.time() - start < 2
+
+    # The server still serves the others.
+    client = zerorpc.Client(context=monitored_context())
+    client.connect(endpoint)
+    assert client._zerorpc_ping()[0] == u'pong'
+    client.close()
+    srv.close()
+
+
+def test_events_lost_peer_handler():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.ROUTER, context=monitored_context())
+    server.bind(endpoint)
+    lost = gevent.queue.Queue()
+    server.add_lost_peer_handler(lost.put)
+    client = zerorpc.Events(zmq.DEALER, context=monitored_context())
+    client.connect(endpoint)
+
+    client.emit(u'hello', (1,))
+    event = server.recv()
+    client.close()
+    assert lost.get(timeout=3) == tuple(x.bytes for x in event.identity)
+    server.close()
+
+
+def test_unmonitored_waits_for_heartbeat():
+    endpoint = random_ipc_endpoint()
+    lost = gevent.event.Event()
+
+    class MySrv(zerorpc.Server):
+
+        def slow(self):
+            try:
+                gevent.sleep(10)
+            except zerorpc.LostRemote:
+                lost.set()
+                raise
+
+    srv = MySrv(heartbeat=2, context=zerorpc.Context())
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(heartbeat=2, context=zerorpc.Context())
+    client.connect(endpoint)
+    gevent.spawn(client.slow)
+    gevent.sleep(0.3)
+    client.close()
+    assert not lost.wait(timeout=1)
+    srv.close()
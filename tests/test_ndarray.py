@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import print_function, absolute_import
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint, skip
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def ndarray_context():
+    context = zerorpc.Context()
+    zerorpc.register_ndarray(context)
+    return context
+
+
+def requires_numpy(test):
+    if numpy is None:
+        return skip('numpy is not installed')(test)
+    return test
+
+
+@requires_numpy
+def test_events_ndarray():
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.PULL, context=ndarray_context())
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.PUSH, context=ndarray_context())
+    client.connect(endpoint)
+
+    arrays = [
+        numpy.arange(12, dtype=numpy.float32).reshape(3, 4),
+        numpy.arange(12, dtype=numpy.int64).reshape(3, 4).T,
+        numpy.zeros(3, dtype=[('a', '<i4'), ('b', '<f8', (2,))]),
+        numpy.array(42),
+    ]
+    client.emit('myevent', (arrays, u'tail'))
+    event = server.recv()
+    assert event.header[u'frames'] == len(arrays)
+    (received, tail) = event.args
+    assert tail == u'tail'
+    for a, b in zip(arrays, received):
+        assert a.dtype == b.dtype
+        assert a.shape == b.shape
+        assert (a == b).all()
+
+
+@requires_numpy
+def test_ndarray_client_server():
+    endpoint = random_ipc_endpoint()
+
+    class Srv(zerorpc.Server):
+        def double(self, array):
+            return array * 2
+
+    srv = Srv(context=ndarray_context())
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=ndarray_context())
+    client.connect(endpoint)
+    array = numpy.arange(1000, dtype=numpy.float64)
+    assert (client.double(array) == array * 2).all()
+    client.close()
+    srv.close()
+
+
+@requires_numpy
+def test_ndarray_not_registered():
+    context = zerorpc.Context()
+    events = zerorpc.Events(zmq.PUSH, context=context)
+    try:
+        events.emit('myevent', (numpy.arange(3),))
+    except TypeError:
+        pass
+    else:
+        assert False, 'ndarray should not be serializable'
+
+
+@requires_numpy
+def test_ndarray_chunked_result():
+    endpoint = random_ipc_endpoint()
+    context = ndarray_context()
+    context.chunk_size = 1000
+
+    class MySrv(zerorpc.Server):
+
+        def arrays(self):
+            return [numpy.arange(1000, dtype=numpy.float64), u'tail',
+                    numpy.arange(6, dtype=numpy.int8).reshape(2, 3)]
+
+    srv = MySrv(context=context)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=ndarray_context())
+    client.connect(endpoint)
+    (a, tail, b) = client.arrays()
+    assert tail == u'tail'
+    assert (a == numpy.arange(1000, dtype=numpy.float64)).all()
+    assert b.shape == (2, 3)
+    assert (b == numpy.arange(6, dtype=numpy.int8).reshape(2, 3)).all()
+    client.close()
+    srv.close()
+
+
+class Sample(object):
+    __slots__ = ['name', 'data']
+
+
+@requires_numpy
+def test_ndarray_in_record():
+    endpoint = random_ipc_endpoint()
+    context = ndarray_context()
+    zerorpc.register_record_type(context, Sample, 16)
+    server = zerorpc.Events(zmq.PULL, context=context)
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.PUSH, context=context)
+    client.connect(endpoint)
+
+    samples = []
+    for i in range(3):
+        sample = Sample()
+        sample.name = u'sample {0}'.format(i)
+        sample.data = numpy.arange(i * 10, dtype=numpy.float32)
+        samples.append(sample)
+    client.emit('myevent', (samples,))
+    event = server.recv()
+    assert event.header[u'frames'] == 3
+    for (sample, received) in zip(samples, event.args[0]):
+        assert received.name == sample.name
+        assert (received.data == sample.data).all()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+import json
+
+import gevent
+import msgpack
+
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+SNAPSHOT = {u'version': 3, u'hosts': [u'a', u'b', u'c'], u'blob': b'\x00' * 16}
+PACKED_SNAPSHOT = msgpack.packb(SNAPSHOT, use_bin_type=True)
+
+
+def raw_server(context):
+    class MySrv(zerorpc.Server):
+
+        def snapshot(self):
+            return zerorpc.RawResult(PACKED_SNAPSHOT)
+
+        @zerorpc.stream
+        def snapshots(self, count):
+            for i in range(count):
+                if i % 2:
+                    yield zerorpc.RawResult(msgpack.packb([i, u'raw']))
+                else:
+                    yield [i, u'packed']
+
+    srv = MySrv(context=context)
+    endpoint = random_ipc_endpoint()
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+    return (srv, endpoint)
+
+
+def test_raw_result():
+    (srv, endpoint) = raw_server(zerorpc.Context())
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    assert client.snapshot() == SNAPSHOT
+    client.close()
+    srv.close()
+
+
+def test_raw_result_chunked():
+    context = zerorpc.Context()
+    context.chunk_size = 8
+    (srv, endpoint) = raw_server(context)
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    assert client.snapshot() == SNAPSHOT
+    client.close()
+    srv.close()
+
+
+def test_raw_result_with_codec():
+    # The raw result is re-encoded for a peer negotiating another codec.
+    context = zerorpc.Context()
+    context.register_serializer(u'json',
+            lambda args: json.dumps(args).encode('utf-8'),
+            lambda blob: json.loads(bytes(blob).decode('utf-8')))
+    (srv, endpoint) = raw_server(context)
+
+    client_context = zerorpc.Context()
+    client_context.register_serializer(u'json',
+            lambda args: json.dumps(args).encode('utf-8'),
+            lambda blob: json.loads(bytes(blob).decode('utf-8')))
+    client = zerorpc.Client(context=client_context)
+    client.connect(endpoint)
+    # The first call negotiates the codec.
+    assert list(client.snapshots(2)) == [[0, u'packed'], [1, u'raw']]
+    assert list(client.snapshots(2)) == [[0, u'packed'], [1, u'raw']]
+    client.close()
+    srv.close()
+
+
+def test_raw_stream_items():
+    (srv, endpoint) = raw_server(zerorpc.Context())
+    client = zerorpc.Client(context=zerorpc.Context())
+    client.connect(endpoint)
+    assert list(client.snapshots(4)) == [[0, u'packed'], [1, u'raw'],
+            [2, u'packed'], [3, u'raw']]
+    client.close()
+    srv.close()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+def test_shard_endpoints():
+    assert zerorpc.shard_endpoints('tcp://127.0.0.1:4242', 1) == \
+        ['tcp://127.0.0.1:4242']
+    assert zerorpc.shard_endpoints('tcp://127.0.0.1:4242', 3) == \
+        ['tcp://127.0.0.1:4242', 'tcp://127.0.0.1:4243', 'tcp://127.0.0.1:4244']
+    assert zerorpc.shard_endpoints('ipc://a', 3) == \
+        ['ipc://a', 'ipc://a.1', 'ipc://a.2']
+    try:
+        zerorpc.shard_endpoints('tcp://127.0.0.1:*', 2)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_shards_io_thread_affinity():
+    srv = zerorpc.Server({}, context=zerorpc.Context(io_threads=2), shards=3)
+    affinities = [events._socket.getsockopt(zmq.AFFINITY)
+                  for events in srv._shards]
+    assert affinities == [1, 2, 1]
+    srv.close()
+
+
+def test_sharded_server():
+    endpoint = random_ipc_endpoint()
+
+    class MySrv(zerorpc.Server):
+
+        def add(self, a, b):
+            return a + b
+
+        @zerorpc.stream
+        def range(self, n):
+            return range(n)
+
+    context = zerorpc.Context(io_threads=2)
+    srv = MySrv(context=context, shards=3)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    clients = []
+    for shard_endpoint in zerorpc.shard_endpoints(endpoint, 3):
+        client = zerorpc.Client(context=context, method_ids=True)
+        client.connect(shard_endpoint)
+        clients.append(client)
+    client = zerorpc.Client(context=context, shards=3)
+    client.connect(endpoint)
+    clients.append(client)
+
+    for client in clients:
+        assert client.add(1, 2) == 3
+        assert list(client.range(300)) == list(range(300))
+        client.close()
+    srv.close()
+
+
+def test_sharded_server_endpoint_list():
+    endpoints = [random_ipc_endpoint(), random_ipc_endpoint()]
+    srv = zerorpc.Server({'echo': lambda x: x}, shards=2)
+    try:
+        srv.bind(endpoints[:1])
+        assert False
+    except ValueError:
+        pass
+    srv.bind(endpoints)
+    gevent.spawn(srv.run)
+    for endpoint in endpoints:
+        client = zerorpc.Client(endpoint)
+        assert client.echo(u'x') == u'x'
+        client.close()
+    srv.close()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import print_function, absolute_import
+
+import gevent
+
+from zerorpc import zmq
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+def test_context_io_threads():
+    context = zerorpc.Context(io_threads=2)
+    assert context.get(zmq.IO_THREADS) == 2
+    assert zerorpc.Context().get(zmq.IO_THREADS) == 1
+
+
+def test_context_socket_options():
+    context = zerorpc.Context()
+    assert context.socket_options == {}
+    context.socket_options = {u'sndhwm': 10, zmq.LINGER: 0}
+    assert context.socket_options == {zmq.SNDHWM: 10, zmq.LINGER: 0}
+    socket = context.socket(zmq.DEALER)
+    assert socket.getsockopt(zmq.SNDHWM) == 10
+    assert socket.getsockopt(zmq.LINGER) == 0
+    assert socket.getsockopt(zmq.RCVHWM) == 1000
+    socket.close()
+
+
+def test_socket_options_override_context():
+    context = zerorpc.Context()
+    context.socket_options = {u'sndhwm': 10, u'rcvhwm': 20}
+    options = {u'rcvhwm': 30, u'immediate': 1, u'tcp_keepalive': 1,
+               u'sndbuf': 1 << 20}
+    for socket in (zerorpc.Server(context=context, socket_options=options),
+                   zerorpc.Client(context=context, socket_options=options),
+                   zerorpc.Pusher(context=context, socket_options=options),
+                   zerorpc.Puller(context=context, socket_options=options)):
+        zmq_socket = socket._events._socket
+        assert zmq_socket.getsockopt(zmq.SNDHWM) == 10
+        assert zmq_socket.getsockopt(zmq.RCVHWM) == 30
+        assert zmq_socket.getsockopt(zmq.IMMEDIATE) == 1
+        assert zmq_socket.getsockopt(zmq.TCP_KEEPALIVE) == 1
+        assert zmq_socket.getsockopt(zmq.SNDBUF) == 1 << 20
+        socket.close()
+
+
+def test_tuned_client_server():
+    endpoint = random_ipc_endpoint()
+    context = zerorpc.Context(io_threads=2)
+    context.socket_options = {u'sndhwm': 100, u'rcvhwm': 100, u'linger': 0}
+    srv = zerorpc.Server({'add': lambda a, b: a + b}, context=context)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+
+    client = zerorpc.Client(context=context, socket_options={u'immediate': 1})
+    client.connect(endpoint)
+    for i in range(3):
+        assert client.add(i, 1) == i + 1
+    client.close()
+    srv.close()
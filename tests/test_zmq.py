@@ -27,8 +27,12 @@ from __future__ import print_function
 from __future__ import absolute_import
 import gevent
 
+from zmq import green as green_zmq
+
+import zerorpc
 from zerorpc import zmq
 from .testutils import teardown, random_ipc_endpoint
+from . import zmqbug
 
 
 def test1():
@@ -64,3 +68,43 @@ def test1():
     s = gevent.spawn(server)
     c = gevent.spawn(client)
     c.join()
+
+
+def test_concurrent_send_recv_never_stalls():
+    # See zmqbug.py: a send must not swallow the readiness of a recv waiting
+    # in another greenlet (and vice versa).
+    longest = zmqbug.run(5000, random_ipc_endpoint(), max_stall=0.5)
+    assert longest < 0.5
+
+
+def test_socket_backend():
+    context = zerorpc.Context()
+    context.socket_backend = u'green'
+    assert isinstance(context.socket(zmq.DEALER), green_zmq.Socket)
+    context.socket_backend = u'gevent_zmq'
+    assert isinstance(context.socket(zmq.DEALER), zmq.Socket)
+    try:
+        context.socket_backend = u'nope'
+        assert False
+    except ValueError:
+        pass
+
+
+def test_socket_backends_interoperate():
+    endpoint = random_ipc_endpoint()
+    for server_backend, client_backend in ((u'green', u'gevent_zmq'),
+                                           (u'gevent_zmq', u'green')):
+        server_context = zerorpc.Context()
+        server_context.socket_backend = server_backend
+        srv = zerorpc.Server({'echo': lambda x: x}, context=server_context)
+        srv.bind(endpoint)
+        gevent.spawn(srv.run)
+
+        client_context = zerorpc.Context()
+        client_context.socket_backend = client_backend
+        client = zerorpc.Client(context=client_context)
+        client.connect(endpoint)
+        for i in range(3):
+            assert client.echo(b'x' * (10 ** i)) == b'x' * (10 ** i)
+        client.close()
+        srv.close()
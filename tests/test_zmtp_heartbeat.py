@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import print_function, absolute_import
+import time
+
+import gevent
+
+import zerorpc
+from .testutils import teardown, random_ipc_endpoint
+
+
+class SlowSrv(zerorpc.Server):
+
+    def slow(self, seconds):
+        gevent.sleep(seconds)
+        return seconds
+
+
+def run_server(zmtp_heartbeat):
+    endpoint = random_ipc_endpoint()
+    srv = SlowSrv(heartbeat=0.2, zmtp_heartbeat=zmtp_heartbeat)
+    srv.bind(endpoint)
+    gevent.spawn(srv.run)
+    return srv, endpoint
+
+
+def test_zmtp_heartbeat():
+    srv, endpoint = run_server(True)
+    client = zerorpc.Client(heartbeat=0.2, zmtp_heartbeat=True)
+    client.connect(endpoint)
+
+    # Nobody heartbeats on the channels: the calls would fail after 0.4s if
+    # one end was waiting for them.
+    assert client.slow(1) == 1
+    assert client._events.zmtp_heartbeat()
+    assert [peer.zmtp_hb for peer in srv._events._peers.values()] == [True]
+    assert client.slow(1) == 1
+    client.close()
+    srv.close()
+
+
+def test_zmtp_heartbeat_client_only():
+    srv, endpoint = run_server(False)
+    client = zerorpc.Client(heartbeat=0.2, zmtp_heartbeat=True)
+    client.connect(endpoint)
+
+    for _ in range(2):
+        assert client.slow(1) == 1
+    assert not client._events.zmtp_heartbeat()
+    client.close()
+    srv.close()
+
+
+def test_zmtp_heartbeat_server_only():
+    srv, endpoint = run_server(True)
+    client = zerorpc.Client(heartbeat=0.2)
+    client.connect(endpoint)
+
+    for _ in range(2):
+        assert client.slow(1) == 1
+    client.close()
+    srv.close()
+
+
+def test_zmtp_heartbeat_lost_server():
+    srv, endpoint = run_server(True)
+    client = zerorpc.Client(heartbeat=1, zmtp_heartbeat=True)
+    client.connect(endpoint)
+    assert client.slow(0) == 0
+
+    task = gevent.spawn(client.slow, 10)
+    gevent.sleep(0.3)
+    start = time.time()
+    srv.close()
+    try:
+        task.get(timeout=3)
+        assert False
+    except zerorpc.LostRemote as e:
+        print('got that:', e)
+    assert time.time() - start < 1
+    client.close()
+
+
+def test_zmtp_heartbeat_several_servers():
+    servers = [run_server(True) for _ in range(2)]
+    client = zerorpc.Client(heartbeat=0.2, zmtp_heartbeat=True, timeout=5)
+    for (srv, endpoint) in servers:
+        client.connect(endpoint)
+    for _ in range(4):
+        assert client.slow(0) == 0
+    # A lost connection can't be told apart from the other one, the
+    # channels keep their heartbeats.
+    assert client._events.zmtp_heartbeat() is False
+
+    task = gevent.spawn(client.slow, 10)
+    gevent.sleep(0.1)
+    start = time.time()
+    for (srv, endpoint) in servers:
+        srv.close()
+    try:
+        task.get(timeout=3)
+        assert False
+    except zerorpc.LostRemote as e:
+        print('got that:', e)
+    assert time.time() - start < 2
+    client.close()
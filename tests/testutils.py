@@ -30,6 +30,9 @@ import nose.exc
 import random
 import os
 
+import zerorpc
+from zerorpc import zmq
+
 _tmpfiles = []
 
 def random_ipc_endpoint():
@@ -56,6 +59,48 @@ def skip(reason):
         return wrap
     return _skip
 
+class CountingReceiver(object):
+
+    def __init__(self, recv):
+        self._recv = recv
+        self.messages = 0
+
+    def __call__(self, timeout=None):
+        parts = self._recv(timeout)
+        self.messages += 1
+        return parts
+
+def new_context(**settings):
+    context = zerorpc.Context()
+    for (name, value) in settings.items():
+        setattr(context, name, value)
+    return context
+
+def dealer_router(setting, server_value, client_value):
+    """A ROUTER and a DEALER Events, with the Context setting given for each
+    end, which exchanged an event to negotiate. Their _recv counts the
+    messages they receive from then on.
+    """
+    endpoint = random_ipc_endpoint()
+    server = zerorpc.Events(zmq.ROUTER,
+            context=new_context(**{setting: server_value}))
+    server.bind(endpoint)
+    client = zerorpc.Events(zmq.DEALER,
+            context=new_context(**{setting: client_value}))
+    client.connect(endpoint)
+
+    # Negotiation.
+    client.emit(u'hello', (0,))
+    event = server.recv()
+    reply = server.new_event(u'hello', (0,))
+    reply.identity = event.identity
+    server.emit_event(reply)
+    client.recv()
+
+    for events in (server, client):
+        events._recv = CountingReceiver(events._recv)
+    return (server, client, event.identity)
+
 try:
     TIME_FACTOR = float(os.environ.get('ZPC_TEST_TIME_FACTOR'))
 except TypeError:
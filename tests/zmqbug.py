@@ -22,144 +22,102 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
-# Based on https://github.com/traviscline/gevent-zeromq/blob/master/gevent_zeromq/core.py
+# Regression test for missed readiness notifications in zerorpc.gevent_zmq.
+#
+# A DEALER sends and receives from two concurrent greenlets against a REP
+# echo server. ZeroMQ's FD is edge-triggered, and a send can swallow the edge
+# announcing an incoming message (and vice versa): if the socket wrapper does
+# not account for it, the receiving greenlet sleeps although messages are
+# waiting. The watchdog below reports any stall, which used to show up as the
+# "gevent_zeromq BUG" catch-up of up to 1 second.
+#
+#   python tests/zmqbug.py [count] [endpoint]
 
 
 from __future__ import print_function
 
-import zmq
-
-import gevent.event
-import gevent.core
-
-STOP_EVERYTHING = False
-
-
-class ZMQSocket(zmq.Socket):
-
-    def __init__(self, context, socket_type):
-        super(ZMQSocket, self).__init__(context, socket_type)
-        on_state_changed_fd = self.getsockopt(zmq.FD)
-        self._readable = gevent.event.Event()
-        self._writable = gevent.event.Event()
-        try:
-            # gevent>=1.0
-            self._state_event = gevent.hub.get_hub().loop.io(
-                on_state_changed_fd, gevent.core.READ)
-            self._state_event.start(self._on_state_changed)
-        except AttributeError:
-            # gevent<1.0
-            self._state_event = gevent.core.read_event(on_state_changed_fd,
-                    self._on_state_changed, persist=True)
-
-    def _on_state_changed(self, event=None, _evtype=None):
-        if self.closed:
-            self._writable.set()
-            self._readable.set()
-            return
-
-        events = self.getsockopt(zmq.EVENTS)
-        if events & zmq.POLLOUT:
-            self._writable.set()
-        if events & zmq.POLLIN:
-            self._readable.set()
-
-    def close(self):
-        if not self.closed and getattr(self, '_state_event', None):
-            try:
-                # gevent>=1.0
-                self._state_event.stop()
-            except AttributeError:
-                # gevent<1.0
-                self._state_event.cancel()
-        super(ZMQSocket, self).close()
-
-    def send(self, data, flags=0, copy=True, track=False):
-        if flags & zmq.NOBLOCK:
-            return super(ZMQSocket, self).send(data, flags, copy, track)
-        flags |= zmq.NOBLOCK
-        while True:
-            try:
-                return super(ZMQSocket, self).send(data, flags, copy, track)
-            except zmq.ZMQError as e:
-                if e.errno != zmq.EAGAIN:
-                    raise
-            self._writable.clear()
-            self._writable.wait()
-
-    def recv(self, flags=0, copy=True, track=False):
-        if flags & zmq.NOBLOCK:
-            return super(ZMQSocket, self).recv(flags, copy, track)
-        flags |= zmq.NOBLOCK
-        while True:
-            try:
-                return super(ZMQSocket, self).recv(flags, copy, track)
-            except zmq.ZMQError as e:
-                if e.errno != zmq.EAGAIN:
-                    raise
-            self._readable.clear()
-            while not self._readable.wait(timeout=10):
-                events = self.getsockopt(zmq.EVENTS)
-                if bool(events & zmq.POLLIN):
-                    print("here we go, nobody told me about new messages!")
-                    global STOP_EVERYTHING
-                    STOP_EVERYTHING = True
-                    raise gevent.GreenletExit()
-
-zmq_context = zmq.Context()
-
-
-def server():
-    socket = ZMQSocket(zmq_context, zmq.REP)
-    socket.bind('ipc://zmqbug')
+import sys
+import time
 
-    class Cnt(object):
-        responded = 0
+import gevent
 
-    cnt = Cnt()
+from zerorpc import gevent_zmq as zmq
 
-    def responder():
-        while not STOP_EVERYTHING:
-            msg = socket.recv()
-            socket.send(msg)
-            cnt.responded += 1
 
-    gevent.spawn(responder)
+class StalledError(Exception):
+    pass
 
-    while not STOP_EVERYTHING:
-        print("cnt.responded=", cnt.responded)
-        gevent.sleep(0.5)
 
-
-def client():
-    socket = ZMQSocket(zmq_context, zmq.DEALER)
-    socket.connect('ipc://zmqbug')
+def run(count=10000, endpoint='ipc://zmqbug', max_stall=0.5, verbose=False):
+    """Exchange ``count`` messages, raise StalledError if the exchange makes
+    no progress for ``max_stall`` seconds. Return the longest stall seen."""
+    zmq_context = zmq.Context()
+    server_socket = zmq_context.socket(zmq.REP)
+    server_socket.bind(endpoint)
+    client_socket = zmq_context.socket(zmq.DEALER)
+    client_socket.connect(endpoint)
 
     class Cnt(object):
+        responded = 0
         recv = 0
         send = 0
 
     cnt = Cnt()
 
+    def responder():
+        while True:
+            msg = server_socket.recv()
+            server_socket.send(msg)
+            cnt.responded += 1
+
     def recvmsg():
-        while not STOP_EVERYTHING:
-            socket.recv()
-            socket.recv()
+        while cnt.recv < count:
+            client_socket.recv()
+            client_socket.recv()
             cnt.recv += 1
 
     def sendmsg():
-        while not STOP_EVERYTHING:
-            socket.send('', flags=zmq.SNDMORE)
-            socket.send('hello')
+        while cnt.send < count:
+            client_socket.send(b'', flags=zmq.SNDMORE)
+            client_socket.send(b'hello')
             cnt.send += 1
             gevent.sleep(0)
 
-    gevent.spawn(recvmsg)
-    gevent.spawn(sendmsg)
-
-    while not STOP_EVERYTHING:
-        print("cnt.recv=", cnt.recv, "cnt.send=", cnt.send)
-        gevent.sleep(0.5)
-
-gevent.spawn(server)
-client()
+    greenlets = [gevent.spawn(responder), gevent.spawn(sendmsg)]
+    receiver = gevent.spawn(recvmsg)
+    greenlets.append(receiver)
+    longest = 0
+    try:
+        last, last_progress = -1, time.time()
+        while not receiver.ready():
+            receiver.join(timeout=0.05)
+            now = time.time()
+            progress = (cnt.recv, cnt.send, cnt.responded)
+            if progress != last:
+                last, last_progress = progress, now
+                continue
+            longest = max(longest, now - last_progress)
+            if verbose:
+                print("cnt.recv=", cnt.recv, "cnt.send=", cnt.send,
+                      "cnt.responded=", cnt.responded)
+            if longest > max_stall:
+                raise StalledError(
+                    'no progress for {0:.2f}s: recv={1} send={2} '
+                    'responded={3}'.format(longest, cnt.recv, cnt.send,
+                                           cnt.responded))
+        receiver.get()
+    finally:
+        gevent.killall(greenlets)
+        server_socket.close()
+        client_socket.close()
+        zmq_context.term()
+    return longest
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    endpoint = sys.argv[2] if len(sys.argv) > 2 else 'ipc://zmqbug'
+    start = time.time()
+    longest = run(count, endpoint, verbose=True)
+    print('{0} messages in {1:.2f}s, longest stall {2:.3f}s'.format(
+        count, time.time() - start, longest))
@@ -33,3 +33,8 @@ from .events import *
 from .core import *
 from .heartbeat import *
 from .decorators import *
+from .results import LazyList, RawResult
+from .ndarray import register_ndarray
+from .datatypes import (register_standard_types, register_record_type,
+        Columnar, ColumnarRows, register_columnar)
+from .compression import train_compression_dictionary
@@ -29,7 +29,7 @@ import gevent.local
 import gevent.lock
 import logging
 
-from .exceptions import TimeoutExpired
+from .exceptions import TimeoutExpired, LostRemote
 from .channel_base import ChannelBase
 
 
@@ -42,6 +42,7 @@ class ChannelMultiplexer(ChannelBase):
         self._active_channels = {}   #  存放的是一对一对的 id：通道 
         self._channel_dispatcher_task = None
         self._broadcast_queue = None
+        events.add_lost_peer_handler(self._on_lost_peer)
         if events.recv_is_supported and not ignore_broadcast:   # 支持接收 并且 没有忽略广播
             self._broadcast_queue = gevent.queue.Queue(maxsize=1)
             self._channel_dispatcher_task = gevent.spawn(
@@ -65,6 +66,14 @@ class ChannelMultiplexer(ChannelBase):
     def emit_event(self, event, timeout=None):
         return self._events.emit_event(event, timeout)
 
+    def zmtp_heartbeat(self, event=None):
+        return self._events.zmtp_heartbeat(event)
+
+    def _on_lost_peer(self, peer):
+        for channel in list(self._active_channels.values()):
+            if self._events._peer_key(channel._zmqid) == peer:
+                channel.lost_remote()
+
     def recv(self, timeout=None):
         if self._broadcast_queue is not None:
             event = self._broadcast_queue.get(timeout=timeout)
@@ -118,6 +127,8 @@ class Channel(ChannelBase):
         self._channel_id = None
         self._zmqid = None
         self._queue = gevent.queue.Queue(maxsize=1)
+        self._lost_remote = False
+        self._on_lost_remote = None
         if from_event is not None:
             self._channel_id = from_event.header[u'message_id']      # message id 就是 channel id
             self._zmqid = from_event.identity                        # 类似： b'\x00k\x8bEg'
@@ -133,6 +144,26 @@ class Channel(ChannelBase):
     def emit_is_supported(self):
         return self._multiplexer.emit_is_supported
 
+    @property
+    def on_lost_remote(self):
+        return self._on_lost_remote
+
+    @on_lost_remote.setter
+    def on_lost_remote(self, cb):
+        self._on_lost_remote = cb
+
+    def lost_remote(self):
+        """The connection to the remote end is lost, see
+        Context.monitor_peers."""
+        self._lost_remote = True
+        if self._on_lost_remote is not None:
+            self._on_lost_remote()
+            return
+        try:
+            self._queue.put_nowait(None)    # wakes recv() up
+        except gevent.queue.Full:
+            pass
+
     def close(self):
         if self._channel_id is not None:
             del self._multiplexer._active_channels[self._channel_id]
@@ -154,10 +185,14 @@ class Channel(ChannelBase):
         self._multiplexer.emit_event(event, timeout)
 
     def recv(self, timeout=None):
+        if self._lost_remote and self._queue.empty():
+            raise LostRemote('Lost remote, disconnected')
         try:
             event = self._queue.get(timeout=timeout)
         except gevent.queue.Empty:
             raise TimeoutExpired(timeout)
+        if event is None:
+            raise LostRemote('Lost remote, disconnected')
         return event
 
     @property
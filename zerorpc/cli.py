@@ -63,6 +63,11 @@ parser.add_argument('--heartbeat', default=5, metavar='seconds', type=int,
                     the same frequency as the server. (default: 5s)')
 parser.add_argument('--pool-size', default=None, metavar='count', type=int,
                     help='size of worker pool. --server only.')
+parser.add_argument('--socket-backend', default=None,
+                    choices=['gevent_zmq', 'green'],
+                    help='gevent integration of the zmq sockets: the builtin \
+                    gevent_zmq or pyzmq\'s zmq.green. \
+                    (default: gevent_zmq)')
 parser.add_argument('-j', '--json', default=False, action='store_true',
                     help='arguments are in JSON format and will be be parsed \
                     before being sent to the remote')
@@ -75,6 +80,10 @@ parser.add_argument('-?', '--inspect', default=False, action='store_true',
 parser.add_argument('--active-hb', default=False, action='store_true',
                     help='enable active heartbeat. The default is to \
                     wait for the server to send the first heartbeat')
+parser.add_argument('--zmtp-hb', default=False, action='store_true',
+                    help='check the connections with ZMTP heartbeats, sent \
+                    by libzmq, instead of heartbeating on every channel \
+                    with the peers doing the same')
 parser.add_argument('-d', '--debug', default=False, action='store_true',
                     help='Print zerorpc debug msgs, \
                     like outgoing and incomming messages.')
@@ -89,6 +98,13 @@ parser.add_argument('params', nargs='*',
                     (default)')
 
 
+def new_context(args):
+    context = zerorpc.Context()
+    if args.socket_backend:
+        context.socket_backend = args.socket_backend
+    return context
+
+
 def setup_links(args, socket):
     if args.bind:
         for endpoint in args.bind:
@@ -118,7 +134,8 @@ def run_server(args):
     if callable(server_obj):
         server_obj = server_obj()
 
-    server = zerorpc.Server(server_obj, heartbeat=args.heartbeat, pool_size=args.pool_size)
+    server = zerorpc.Server(server_obj, heartbeat=args.heartbeat, pool_size=args.pool_size,
+            context=new_context(args), zmtp_heartbeat=args.zmtp_hb)
     if args.debug:
         server.debug = True
     setup_links(args, server)
@@ -238,7 +255,8 @@ def zerorpc_inspect(client, method=None, long_doc=True, include_argspec=True):
 
 def run_client(args):
     client = zerorpc.Client(timeout=args.timeout, heartbeat=args.heartbeat,
-            passive_heartbeat=not args.active_hb)
+            passive_heartbeat=not args.active_hb, context=new_context(args),
+            zmtp_heartbeat=args.zmtp_hb)
     if args.debug:
         client.debug = True
     setup_links(args, client)
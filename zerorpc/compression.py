@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import absolute_import
+
+import zlib
+from collections import defaultdict
+
+
+def compress(blob, zdict=None, level=-1):
+    if zdict is None:
+        return zlib.compress(blob, level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS,
+            zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, zdict)
+    return compressor.compress(blob) + compressor.flush()
+
+
+def decompress(blob, zdict=None):
+    if zdict is None:
+        return zlib.decompress(blob)
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict)
+    return decompressor.decompress(blob) + decompressor.flush()
+
+
+def train_compression_dictionary(samples, size=32 * 1024, segment=32):
+    """Build a zlib preset dictionary from samples of the traffic.
+
+    samples are bytes strings, typically the packed args of events (see
+    Event.pack). The segments found most often across samples are kept, the
+    most frequent ones at the end of the dictionary where zlib reaches them
+    with the shortest distances. Register the result on both ends with
+    Context.register_compression_dictionary().
+
+    """
+    counts = defaultdict(int)
+    step = max(segment // 2, 1)
+    for sample in samples:
+        sample = bytes(sample)
+        seen = set()
+        for i in range(0, max(len(sample) - segment, 0) + 1, step):
+            seen.add(sample[i:i + segment])
+        for chunk in seen:
+            counts[chunk] += 1
+    chunks = sorted((c for c in counts if counts[c] > 1),
+            key=lambda c: counts[c], reverse=True)
+    picked = []
+    total = 0
+    for chunk in chunks:
+        if total + len(chunk) > size:
+            break
+        picked.append(chunk)
+        total += len(chunk)
+    picked.reverse()
+    return b''.join(picked)
@@ -24,19 +24,43 @@
 
 
 from __future__ import absolute_import
-from future.utils import tobytes
+from builtins import str
 
+import os
 import uuid
 import random
+import struct
+
+from zmq import green as _green_zmq
 
 from . import gevent_zmq as zmq
 
 
+_msgid_counter = struct.Struct('>I')
+
+# Socket classes a Context can create, see Context.socket_backend.
+_socket_backends = {
+    u'gevent_zmq': zmq.Socket,
+    u'green': _green_zmq.Socket,
+}
+
+
+def _normalize_socket_options(options):
+    """Return (option, value) pairs for a dict of socket options, keyed by zmq
+    constant or by name (u'sndhwm')."""
+    normalized = []
+    for option, value in (options or {}).items():
+        if not isinstance(option, int):
+            option = getattr(zmq, option.upper())
+        normalized.append((option, value))
+    return normalized
+
+
 class Context(zmq.Context):
     _instance = None
 
-    def __init__(self):
-        super(zmq.Context, self).__init__()
+    def __init__(self, io_threads=1):
+        super(zmq.Context, self).__init__(io_threads=io_threads)
         self._middlewares = []
         self._hooks = {
             'resolve_endpoint': [],
@@ -50,6 +74,26 @@ class Context(zmq.Context):
             'client_after_request': [],
             'client_patterns_list': [],
         }
+        self._serializers = {}
+        self._serializers_order = [u'msgpack']
+        self._oob_threshold = None
+        self._compact_protocol = True
+        self._compress_threshold = None
+        self._compression_dictionaries = {}
+        self._compression_dictionary = None
+        self._chunk_size = 1024 * 1024
+        self._bundle_events = False
+        self._bundle_window = 0
+        self._bundle_size = 64 * 1024
+        self._fragment_size = None
+        self._monitor_peers = False
+        self._local_calls = False
+        self._local_servers = {}  # inproc endpoint -> LocalEvents
+        self._ext_types = {}
+        self._ext_codes = {}
+        self._socket_options = []
+        self._socket_backend = os.environ.get('ZERORPC_SOCKET_BACKEND',
+                                              u'gevent_zmq')
         self._reset_msgid()
 
     # NOTE: pyzmq 13.0.0 messed up with setattr (they turned it into a
@@ -72,6 +116,381 @@ class Context(zmq.Context):
     def _hooks(self, value):
         self.__dict__['_hooks'] = value
 
+    @property
+    def _serializers(self):
+        return self.__dict__['_serializers']
+
+    @_serializers.setter
+    def _serializers(self, value):
+        self.__dict__['_serializers'] = value
+
+    @property
+    def _serializers_order(self):
+        return self.__dict__['_serializers_order']
+
+    @_serializers_order.setter
+    def _serializers_order(self, value):
+        self.__dict__['_serializers_order'] = value
+
+    @property
+    def _ext_types(self):
+        return self.__dict__['_ext_types']
+
+    @_ext_types.setter
+    def _ext_types(self, value):
+        self.__dict__['_ext_types'] = value
+
+    @property
+    def _ext_codes(self):
+        return self.__dict__['_ext_codes']
+
+    @_ext_codes.setter
+    def _ext_codes(self, value):
+        self.__dict__['_ext_codes'] = value
+
+    @property
+    def _compact_protocol(self):
+        return self.__dict__['_compact_protocol']
+
+    @_compact_protocol.setter
+    def _compact_protocol(self, value):
+        self.__dict__['_compact_protocol'] = value
+
+    @property
+    def compact_protocol(self):
+        """Negotiate the compact protocol v4 with the peers (the default).
+
+        See doc/protocol.md, peers not supporting it keep talking v3.
+
+        """
+        return self._compact_protocol
+
+    @compact_protocol.setter
+    def compact_protocol(self, value):
+        self._compact_protocol = value
+
+    @property
+    def _socket_backend(self):
+        return self.__dict__['_socket_backend']
+
+    @_socket_backend.setter
+    def _socket_backend(self, value):
+        if value not in _socket_backends:
+            raise ValueError('unknown socket backend {0!r}, expected one of '
+                             '{1}'.format(value, sorted(_socket_backends)))
+        self.__dict__['_socket_backend'] = value
+
+    @property
+    def socket_backend(self):
+        """Integration of the zmq sockets with gevent.
+
+        u'gevent_zmq' (zerorpc/gevent_zmq.py, the default) or u'green'
+        (pyzmq's zmq.green). Only affects the sockets created afterwards. The
+        default can be changed with the ZERORPC_SOCKET_BACKEND environment
+        variable.
+
+        """
+        return self._socket_backend
+
+    @socket_backend.setter
+    def socket_backend(self, value):
+        self._socket_backend = value
+
+    @property
+    def _socket_options(self):
+        return self.__dict__['_socket_options']
+
+    @_socket_options.setter
+    def _socket_options(self, value):
+        self.__dict__['_socket_options'] = value
+
+    @property
+    def socket_options(self):
+        """Options set on every socket created afterwards by this context.
+
+        A dict of option to value, the option being a zmq constant or its
+        name, case insensitive (u'sndhwm'). Server, Client, Pusher, Puller
+        and friends take a socket_options argument applied on top of these.
+        By default nothing is set and libzmq's defaults apply:
+
+            SNDHWM, RCVHWM: 1000 messages
+            SNDBUF, RCVBUF: -1, the OS default
+            TCP_KEEPALIVE (and _IDLE, _INTVL, _CNT): -1, the OS default
+            IMMEDIATE: 0, queue messages to peers not connected yet
+            LINGER: -1, keep unsent messages until the context is terminated
+
+        The number of libzmq I/O threads is given at construction,
+        Context(io_threads=1); the shared Context.get_instance() uses one.
+
+        """
+        return dict(self._socket_options)
+
+    @socket_options.setter
+    def socket_options(self, options):
+        self._socket_options = _normalize_socket_options(options)
+
+    def socket(self, socket_type):
+        if self.closed:
+            raise zmq.ZMQError(zmq.ENOTSUP)
+        socket = _socket_backends[self._socket_backend](self, socket_type)
+        for option, value in self._socket_options:
+            socket.setsockopt(option, value)
+        return socket
+
+    @property
+    def _chunk_size(self):
+        return self.__dict__['_chunk_size']
+
+    @_chunk_size.setter
+    def _chunk_size(self, value):
+        self.__dict__['_chunk_size'] = value
+
+    @property
+    def chunk_size(self):
+        """Size above which the result of a call is sent in chunks.
+
+        The result is then sent as a sequence of events of at most this size,
+        flow controlled like a stream, to clients which advertise they can
+        reassemble it. 1MiB by default, None disables it.
+
+        """
+        return self._chunk_size
+
+    @chunk_size.setter
+    def chunk_size(self, value):
+        self._chunk_size = value
+
+    @property
+    def _bundle_events(self):
+        return self.__dict__['_bundle_events']
+
+    @_bundle_events.setter
+    def _bundle_events(self, value):
+        self.__dict__['_bundle_events'] = value
+
+    @property
+    def _bundle_window(self):
+        return self.__dict__['_bundle_window']
+
+    @_bundle_window.setter
+    def _bundle_window(self, value):
+        self.__dict__['_bundle_window'] = value
+
+    @property
+    def _bundle_size(self):
+        return self.__dict__['_bundle_size']
+
+    @_bundle_size.setter
+    def _bundle_size(self, value):
+        self.__dict__['_bundle_size'] = value
+
+    @property
+    def bundle_events(self):
+        """Bundle the small events sent to a peer in a single ZMQ message.
+
+        Only between DEALER and ROUTER sockets, and with peers which
+        negotiated it: both ends must enable it. Disabled by default.
+
+        """
+        return self._bundle_events
+
+    @bundle_events.setter
+    def bundle_events(self, value):
+        self._bundle_events = value
+
+    @property
+    def bundle_window(self):
+        """Seconds an event waits for others to share its message.
+
+        0 (the default) bundles the events emitted before the gevent loop
+        runs again, without delaying them.
+
+        """
+        return self._bundle_window
+
+    @bundle_window.setter
+    def bundle_window(self, value):
+        self._bundle_window = value
+
+    @property
+    def bundle_size(self):
+        """A bundle is sent as soon as it reaches this size in bytes."""
+        return self._bundle_size
+
+    @bundle_size.setter
+    def bundle_size(self, value):
+        self._bundle_size = value
+
+    @property
+    def _fragment_size(self):
+        return self.__dict__['_fragment_size']
+
+    @_fragment_size.setter
+    def _fragment_size(self, value):
+        self.__dict__['_fragment_size'] = value
+
+    @property
+    def fragment_size(self):
+        """Size in bytes above which an event is sent in fragments.
+
+        The fragments of a large event are scheduled like any other message,
+        so the small events of other channels can be sent between them.
+        Only between DEALER and ROUTER sockets, and with peers which
+        negotiated it: both ends must enable it. None (the default) disables
+        it.
+
+        """
+        return self._fragment_size
+
+    @fragment_size.setter
+    def fragment_size(self, value):
+        self._fragment_size = value
+
+    @property
+    def _monitor_peers(self):
+        return self.__dict__['_monitor_peers']
+
+    @_monitor_peers.setter
+    def _monitor_peers(self, value):
+        self.__dict__['_monitor_peers'] = value
+
+    @property
+    def monitor_peers(self):
+        """Watch the connections of DEALER and ROUTER sockets.
+
+        A zmq socket monitor then reports the peers which disconnect, and
+        their channels fail right away with LostRemote instead of after two
+        missed heartbeats. For a DEALER, only when it is connected to a
+        single endpoint. Only affects the sockets created afterwards.
+        Disabled by default.
+
+        """
+        return self._monitor_peers
+
+    @monitor_peers.setter
+    def monitor_peers(self, value):
+        self._monitor_peers = value
+
+    @property
+    def _local_calls(self):
+        return self.__dict__['_local_calls']
+
+    @_local_calls.setter
+    def _local_calls(self, value):
+        self.__dict__['_local_calls'] = value
+
+    @property
+    def _local_servers(self):
+        return self.__dict__['_local_servers']
+
+    @_local_servers.setter
+    def _local_servers(self, value):
+        self.__dict__['_local_servers'] = value
+
+    @property
+    def local_calls(self):
+        """Call the Servers of this context without zmq when possible.
+
+        A Client connected to a single inproc endpoint, bound by a Server
+        of this context, then hands its events over to the server as Python
+        objects: nothing is serialized. The hooks and middlewares are called
+        as usual, but the args and results are shared rather than copied and
+        keep their Python types (a tuple stays a tuple). Only affects the
+        servers bound afterwards. Disabled by default.
+
+        """
+        return self._local_calls
+
+    @local_calls.setter
+    def local_calls(self, value):
+        self._local_calls = value
+
+    @property
+    def _compress_threshold(self):
+        return self.__dict__['_compress_threshold']
+
+    @_compress_threshold.setter
+    def _compress_threshold(self, value):
+        self.__dict__['_compress_threshold'] = value
+
+    @property
+    def _compression_dictionaries(self):
+        return self.__dict__['_compression_dictionaries']
+
+    @_compression_dictionaries.setter
+    def _compression_dictionaries(self, value):
+        self.__dict__['_compression_dictionaries'] = value
+
+    @property
+    def _compression_dictionary(self):
+        return self.__dict__['_compression_dictionary']
+
+    @_compression_dictionary.setter
+    def _compression_dictionary(self, value):
+        self.__dict__['_compression_dictionary'] = value
+
+    @property
+    def compress_threshold(self):
+        """Size from which the packed args of an event are zlib compressed.
+
+        Compressed events are flagged in their header, smaller events are
+        sent as is. None (the default) disables it: older versions of zerorpc
+        can't decompress events.
+
+        """
+        return self._compress_threshold
+
+    @compress_threshold.setter
+    def compress_threshold(self, value):
+        self._compress_threshold = value
+
+    def register_compression_dictionary(self, dict_id, zdict):
+        """Register a zlib preset dictionary.
+
+        See zerorpc.train_compression_dictionary(). Both ends must register
+        the same dictionary under the same id.
+
+        """
+        self._compression_dictionaries[dict_id] = zdict
+
+    def get_compression_dictionary(self, dict_id):
+        return self._compression_dictionaries[dict_id]
+
+    @property
+    def compression_dictionary(self):
+        """The id of the dictionary used to compress, None for none."""
+        return self._compression_dictionary
+
+    @compression_dictionary.setter
+    def compression_dictionary(self, dict_id):
+        if dict_id is not None and dict_id not in self._compression_dictionaries:
+            raise KeyError(dict_id)
+        self._compression_dictionary = dict_id
+
+    @property
+    def _oob_threshold(self):
+        return self.__dict__['_oob_threshold']
+
+    @_oob_threshold.setter
+    def _oob_threshold(self, value):
+        self.__dict__['_oob_threshold'] = value
+
+    @property
+    def oob_threshold(self):
+        """Size from which bytes-like args are sent as out-of-band frames.
+
+        Such values are sent as separate zmq frames (without copy) instead of
+        being packed with the rest of the event, and are received as
+        memoryviews over those frames. None (the default) disables it: older
+        versions of zerorpc can't receive out-of-band frames.
+
+        """
+        return self._oob_threshold
+
+    @oob_threshold.setter
+    def oob_threshold(self, value):
+        self._oob_threshold = value
+
     @property
     def _msg_id_base(self):
         return self.__dict__['_msg_id_base']
@@ -103,16 +522,17 @@ class Context(zmq.Context):
         return Context._instance
 
     def _reset_msgid(self):
-        self._msg_id_base = tobytes(uuid.uuid4().hex)[8:]
+        self._msg_id_base = uuid.uuid4().bytes[8:]
         self._msg_id_counter = random.randrange(0, 2 ** 32)
         self._msg_id_counter_stop = random.randrange(self._msg_id_counter, 2 ** 32)
 
     def new_msgid(self):                                              # message id 就是 channel id ; 看 channel.Channel()._channel_id
+        # 12 opaque bytes: a 32 bits counter followed by 8 random bytes.
         if self._msg_id_counter >= self._msg_id_counter_stop:
             self._reset_msgid()
         else:
             self._msg_id_counter = (self._msg_id_counter + 1)
-        return tobytes('{0:08x}'.format(self._msg_id_counter)) + self._msg_id_base
+        return _msgid_counter.pack(self._msg_id_counter) + self._msg_id_base
 
     def register_middleware(self, middleware_instance):
         registered_count = 0
@@ -129,6 +549,81 @@ class Context(zmq.Context):
                 registered_count += 1
         return registered_count
 
+    #
+    # serializers
+    #
+    def register_serializer(self, codec_id, encode, decode):
+        """Register a codec for the arguments of the events.
+
+        `encode` takes the arguments of an event and returns a bytes string,
+        `decode` does the opposite. Codecs are preferred in the order they
+        are registered, msgpack (the default wire format) always comes last.
+
+        Both ends of a connection must have registered the same codec_id for
+        it to be negotiated, see doc/protocol.md.
+
+        """
+        codec_id = str(codec_id)
+        if codec_id == u'msgpack':
+            raise ValueError('msgpack is the builtin codec')
+        if codec_id not in self._serializers:
+            self._serializers_order.insert(-1, codec_id)
+        self._serializers[codec_id] = (encode, decode)
+
+    def get_serializer(self, codec_id):
+        """Returns the (encode, decode) couple of a registered codec.
+
+        msgpack maps to (None, None): the arguments are then packed inline
+        with the rest of the event.
+
+        """
+        if codec_id == u'msgpack':
+            return (None, None)
+        return self._serializers[codec_id]
+
+    @property
+    def serializers(self):
+        return list(self._serializers_order)
+
+    def register_ext_type(self, code, cls, encode, decode):
+        """Register a msgpack ext type for the instances of cls.
+
+        `encode(obj, attach)` returns the bytes string packed inline, it can
+        call `attach(buffer)` to send a buffer as an out-of-band frame (see
+        oob_threshold), which returns the index of that frame.
+        `decode(data, frame)` rebuilds the object, `frame(index)` returns a
+        memoryview over a received out-of-band frame.
+
+        Codes 0 to 15 are reserved for zerorpc itself, both ends must
+        register the same code for the same type.
+
+        """
+        if code in self._ext_codes and self._ext_codes[code][0] is not cls:
+            raise ValueError('ext type code {0} is already used by {1}'.format(
+                code, self._ext_codes[code][0]))
+        self._ext_types[cls] = (code, encode)
+        self._ext_codes[code] = (cls, decode)
+
+    def get_ext_encoder(self, obj):
+        """Returns (code, encode) for obj or None if its type isn't registered."""
+        ext_types = self._ext_types
+        if not ext_types:
+            return None
+        for cls in type(obj).__mro__:
+            if cls in ext_types:
+                return ext_types[cls]
+        return None
+
+    def get_ext_decoder(self, code):
+        entry = self._ext_codes.get(code)
+        if entry is None:
+            return None
+        return entry[1]
+
+    @property
+    def ext_types_registered(self):
+        return bool(self._ext_types)
+
     #
     # client/server
     #
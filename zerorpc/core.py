@@ -28,8 +28,11 @@ from builtins import str
 from builtins import zip
 from future.utils import iteritems
 
+import functools
+import random
 import sys
 import traceback
+import zlib
 import gevent.pool
 import gevent.queue
 import gevent.event
@@ -37,10 +40,12 @@ import gevent.local
 import gevent.lock
 
 from . import gevent_zmq as zmq
-from .exceptions import TimeoutExpired, RemoteError, LostRemote
+from .exceptions import (TimeoutExpired, RemoteError, LostRemote,
+        MethodTableMismatch)
 from .channel import ChannelMultiplexer, BufferedChannel
 from .socket import SocketBase
 from .heartbeat import HeartBeatOnChannel
+from .local import LocalEvents
 from .context import Context
 from .decorators import DecoratorBase, rep
 from . import patterns
@@ -54,6 +59,8 @@ class ServerBase(object):
     def __init__(self, channel, methods=None, name=None, context=None,
             pool_size=None, heartbeat=5):
         self._multiplexer = ChannelMultiplexer(channel)
+        # One per socket of a sharded Server, they share everything else.
+        self._multiplexers = [self._multiplexer]
 
         if methods is None:
             methods = self
@@ -71,6 +78,12 @@ class ServerBase(object):
             if not isinstance(functor, DecoratorBase):
                 self._methods[k] = rep(functor)
 
+        # Clients can call the methods by their index in this table, see
+        # ClientBase(method_ids=True).
+        self._method_names = sorted(self._methods)
+        self._method_functors = [self._methods[m] for m in self._method_names]
+        self._method_table_crc = method_table_crc(self._method_names)
+
     @staticmethod
     def _filter_methods(cls, self, methods):
         if isinstance(methods, dict):
@@ -90,7 +103,8 @@ class ServerBase(object):
 
     def close(self):
         self.stop()
-        self._multiplexer.close()
+        for multiplexer in self._multiplexers:
+            multiplexer.close()
 
     def _format_args_spec(self, args_spec, r=None):      # args_spec: inspect.getargspec(func(a, b=10))--> ArgSpec(args=['a', 'b'], varargs=None, keywords=None, defaults=(10,))
         if args_spec:
@@ -126,6 +140,7 @@ class ServerBase(object):
         self._methods['_zerorpc_args'] = \
             lambda m: self._methods[m]._zerorpc_args()
         self._methods['_zerorpc_inspect'] = self._zerorpc_inspect
+        self._methods['_zerorpc_methods'] = lambda: self._method_names
 
     def __call__(self, method, *args):
         if method not in self._methods:
@@ -143,18 +158,26 @@ class ServerBase(object):
         human_msg = str(exc_value)
         return (name, human_msg, human_traceback)
 
-    def _async_task(self, initial_event):
+    def _async_task(self, initial_event, multiplexer=None):
         protocol_v1 = initial_event.header.get(u'v', 1) < 2
-        channel = self._multiplexer.channel(initial_event)   # 拿到第一个 event，然后创建 channel
-        hbchan = HeartBeatOnChannel(channel, freq=self._heartbeat_freq,
-                passive=protocol_v1)       # 心跳 channel， 其中将不是心跳的帧放到 其 queue中了 通过recv 获取
-        bufchan = BufferedChannel(hbchan)      # BufferedChannel 没全看明白 里面维护两个长度(远端队列长度和本地队列长度)， 一个队列（存放将要发送的event）
+        multiplexer = multiplexer or self._multiplexer
+        channel = multiplexer.channel(initial_event)   # 拿到第一个 event，然后创建 channel
+        if multiplexer.zmtp_heartbeat(initial_event):
+            _fail_on_lost_remote(channel)
+            bufchan = BufferedChannel(channel)
+        else:
+            hbchan = HeartBeatOnChannel(channel, freq=self._heartbeat_freq,
+                    passive=protocol_v1)       # 心跳 channel， 其中将不是心跳的帧放到 其 queue中了 通过recv 获取
+            bufchan = BufferedChannel(hbchan)      # BufferedChannel 没全看明白 里面维护两个长度(远端队列长度和本地队列长度)， 一个队列（存放将要发送的event）
     
         exc_infos = None
         event = bufchan.recv()
         try:
             self._context.hook_load_task_context(event.header)         # load_task_context hook 
-            functor = self._methods.get(event.name, None)              # 根据 event.name 获取 event 相对应的函数，functor是被一个类装饰过的了
+            if isinstance(event.name, int):
+                functor = self._method_by_id(event)
+            else:
+                functor = self._methods.get(event.name, None)          # 根据 event.name 获取 event 相对应的函数，functor是被一个类装饰过的了
             if functor is None:
                 raise NameError(event.name)
             functor.pattern.process_call(self._context, bufchan, event, functor)  # 执行函数 和 函数钩子
@@ -172,16 +195,39 @@ class ServerBase(object):
             del exc_infos
             bufchan.close()   # 这里也关闭了 hbchan
 
-    def _acceptor(self):
+    def _method_by_id(self, event):
+        method_id = event.name
+        if event.header.get(u'mtab') != self._method_table_crc:
+            raise MethodTableMismatch('{0}: the method table of the client '
+                'differs, methods were added or removed'.format(method_id))
+        if not 0 <= method_id < len(self._method_names):
+            return None
+        # The hooks see the name of the method, as usual.
+        event.name = self._method_names[method_id]
+        return self._method_functors[method_id]
+
+    def _acceptor(self, multiplexer=None):
         """
            这就是一个请求到来时最开始的地方！！！！
         """
+        multiplexer = multiplexer or self._multiplexer
         while True:
-            initial_event = self._multiplexer.recv()                      # 拿到一个最初的 event
-            self._task_pool.spawn(self._async_task, initial_event)        # 加入到协程池（执行这个函数）
+            initial_event = multiplexer.recv()                            # 拿到一个最初的 event
+            self._task_pool.spawn(self._async_task, initial_event,
+                    multiplexer)                                          # 加入到协程池（执行这个函数）
+
+    def _acceptors(self):
+        if len(self._multiplexers) == 1:
+            return self._acceptor()
+        tasks = [gevent.spawn(self._acceptor, multiplexer)
+                 for multiplexer in self._multiplexers]
+        try:
+            gevent.joinall(tasks, raise_error=True, count=1)
+        finally:
+            gevent.killall(tasks)
 
     def run(self):
-        self._acceptor_task = gevent.spawn(self._acceptor)
+        self._acceptor_task = gevent.spawn(self._acceptors)
         try:
             self._acceptor_task.get()   # 执行 gevent.spawn(self._acceptor) 这个协程
         finally:
@@ -197,13 +243,18 @@ class ServerBase(object):
 class ClientBase(object):
 
     def __init__(self, channel, context=None, timeout=30, heartbeat=5,
-            passive_heartbeat=False):
+            passive_heartbeat=False, method_ids=False):
         self._multiplexer = ChannelMultiplexer(channel,
                 ignore_broadcast=True)
         self._context = context or Context.get_instance()
         self._timeout = timeout
         self._heartbeat_freq = heartbeat
         self._passive_heartbeat = passive_heartbeat
+        # With method_ids, the method table of the server is fetched by the
+        # first call, then the methods are called by their index in it. All
+        # the servers we connect to must expose the same methods.
+        self._method_ids = None if method_ids else {}
+        self._method_table_crc = None
 
     def close(self):
         self._multiplexer.close()
@@ -247,6 +298,25 @@ class ClientBase(object):
         return pattern.process_answer(self._context, bufchan, request_event,
                 reply_event, self._handle_remote_error) # 如果是REP 则返回执行结果， 若是 STREAM 则返回一个迭代器
 
+    def _fetch_method_ids(self):
+        # Calls made meanwhile, including the one below, use the names.
+        self._method_ids = {}
+        try:
+            names = self('_zerorpc_methods')
+        except RemoteError:
+            logger.warning('the server does not expose its method ids, '
+                    'calling methods by name')
+            return
+        except Exception:
+            self._method_ids = None  # Try again with the next call.
+            raise
+        self._method_table_crc = method_table_crc(names)
+        method_ids = {}
+        for (method_id, name) in enumerate(names):
+            method_ids[name] = method_id
+            method_ids[name.encode('utf-8')] = method_id
+        self._method_ids = method_ids
+
     def __call__(self, method, *args, **kargs):
         # here `method` is either a string of bytes or an unicode string in
         # Python2 and Python3. Python2: str aka a byte string containing ASCII
@@ -262,37 +332,113 @@ class ClientBase(object):
         # Right after, msgpack-python will re-encode it as UTF-8. Yes this is
         # terribly inefficient with Python2 because most of the time `method`
         # wll already be an UTF-8 encoded bytes string.
+        if self._method_ids is None:
+            self._fetch_method_ids()
+        method_id = self._method_ids.get(method)
         if isinstance(method, bytes):
             method = method.decode('utf-8')
 
         timeout = kargs.get('timeout', self._timeout)
         channel = self._multiplexer.channel()
-        hbchan = HeartBeatOnChannel(channel, freq=self._heartbeat_freq,
-                passive=self._passive_heartbeat)
-        bufchan = BufferedChannel(hbchan, inqueue_size=kargs.get('slots', 100))
+        # See Client(zmtp_heartbeat=True): until the server tells whether
+        # it checks the connection too, we only answer its heartbeats.
+        zmtp_heartbeat = self._multiplexer.zmtp_heartbeat()
+        if zmtp_heartbeat:
+            _fail_on_lost_remote(channel)
+            bufchan = BufferedChannel(channel,
+                    inqueue_size=kargs.get('slots', 100))
+        else:
+            hbchan = HeartBeatOnChannel(channel, freq=self._heartbeat_freq,
+                    passive=self._passive_heartbeat or zmtp_heartbeat is None)
+            bufchan = BufferedChannel(hbchan,
+                    inqueue_size=kargs.get('slots', 100))
 
         xheader = self._context.hook_get_task_context()
         request_event = bufchan.new_event(method, args, xheader)
+        # We can reassemble a result sent in chunks, see patterns.ReqRep.
+        request_event.header[u'chunked'] = True
         self._context.hook_client_before_request(request_event)  # 钩子 client_before_request
-        bufchan.emit_event(request_event)
-
+        if method_id is None:
+            bufchan.emit_event(request_event)
+        else:
+            # Only the wire sees the id, the hooks see the name.
+            request_event.header[u'mtab'] = self._method_table_crc
+            request_event.name = method_id
+            try:
+                bufchan.emit_event(request_event)
+            finally:
+                request_event.name = method
+
+        process_response = self._process_response
+        if method_id is not None:
+            process_response = functools.partial(self._process_response_by_id,
+                    args=args, kargs=kargs)
         if kargs.get('async', False) is False:   # 如果不是异步的话 就阻塞等待结果
-            return self._process_response(request_event, bufchan, timeout)
+            return process_response(request_event, bufchan, timeout)
 
         async_result = gevent.event.AsyncResult()  # .AsyncResult - 等待单一结果而阻塞,也允许引发异常.
-        gevent.spawn(self._process_response, request_event, bufchan,
+        gevent.spawn(process_response, request_event, bufchan,
                 timeout).link(async_result)
         return async_result
 
+    def _process_response_by_id(self, request_event, bufchan, timeout, args,
+            kargs):
+        try:
+            return self._process_response(request_event, bufchan, timeout)
+        except RemoteError as e:
+            if e.name != MethodTableMismatch.__name__:
+                raise
+        # The server changed (restarted with other methods...): fetch its
+        # method table again and retry.
+        logger.warning('the method table of the server changed, fetching '
+                'it again')
+        self._method_ids = None
+        kargs = dict(kargs)
+        kargs['async'] = False
+        return self(request_event.name, *args, **kargs)
+
     def __getattr__(self, method):
         return lambda *args, **kargs: self(method, *args, **kargs)  # 在这执行 function 请求 ！！！
 
 
+def _fail_on_lost_remote(channel):
+    # What HeartBeatOnChannel does when the remote is lost, for the channels
+    # whose connection is checked by libzmq, see Events.use_zmtp_heartbeat().
+    parent = gevent.getcurrent()
+
+    def lost_remote():
+        gevent.kill(parent, LostRemote('Lost remote, disconnected'))
+    channel.on_lost_remote = lost_remote
+
+
+def method_table_crc(names):
+    return zlib.crc32(u'\0'.join(names).encode('utf-8')) & 0xffffffff
+
+
+def shard_endpoints(endpoint, count):
+    """Expand endpoint into one endpoint per socket of Server(shards=count).
+
+    tcp://host:4242 gives tcp://host:4242, tcp://host:4243 and so on, any
+    other endpoint is followed by endpoint.1, endpoint.2...
+
+    """
+    if count == 1:
+        return [endpoint]
+    if endpoint.startswith('tcp://'):
+        host, _, port = endpoint.rpartition(':')
+        if not port.isdigit():
+            raise ValueError('unable to shard {0}, give one endpoint per '
+                             'shard'.format(endpoint))
+        return ['{0}:{1}'.format(host, int(port) + i) for i in range(count)]
+    return [endpoint] + ['{0}.{1}'.format(endpoint, i)
+                         for i in range(1, count)]
+
+
 class Server(SocketBase, ServerBase):
 
     def __init__(self, methods=None, name=None, context=None, pool_size=None,
-            heartbeat=5):
-        SocketBase.__init__(self, zmq.ROUTER, context)   # zmq.ROUTER zmq 中的一种套接字 https://github.com/anjuke/zguide-cn/blob/master/chapter2.md
+            heartbeat=5, socket_options=None, shards=1, zmtp_heartbeat=False):
+        SocketBase.__init__(self, zmq.ROUTER, context, socket_options)   # zmq.ROUTER zmq 中的一种套接字 https://github.com/anjuke/zguide-cn/blob/master/chapter2.md
         if methods is None:
             methods = self
 
@@ -301,30 +447,167 @@ class Server(SocketBase, ServerBase):
         ServerBase.__init__(self, self._events, methods, name, context,
                 pool_size, heartbeat)
 
+        # With shards > 1, the server binds (or connects) one ROUTER socket
+        # per shard, each served by its own libzmq I/O thread as far as the
+        # context has some, see shard_endpoints().
+        self._shards = [self._events]
+        for _ in range(1, shards):
+            events = self._new_events(zmq.ROUTER)
+            self._shards.append(events)
+            self._multiplexers.append(ChannelMultiplexer(events))
+        if shards > 1:
+            io_threads = self._context.get(zmq.IO_THREADS)
+            for i, events in enumerate(self._shards):
+                events.setsockopt(zmq.AFFINITY, 1 << (i % io_threads))
+        # The connections are then checked by libzmq, and the channels only
+        # heartbeat with the clients which don't do the same.
+        if zmtp_heartbeat and heartbeat is not None:
+            for events in self._shards:
+                events.use_zmtp_heartbeat(heartbeat)
+        self._local_events = None   # see Context.local_calls
+        self._local_acceptor_task = None
+
+    def stop(self):
+        ServerBase.stop(self)
+        if self._local_acceptor_task is not None:
+            self._local_acceptor_task.kill()
+            self._local_acceptor_task = None
+
     def close(self):
+        if self._local_events is not None:
+            local_servers = self._context._local_servers
+            for endpoint, events in list(local_servers.items()):
+                if events is self._local_events:
+                    del local_servers[endpoint]
+            self._local_events.close()
         ServerBase.close(self)
+        for events in self._shards[1:]:
+            events.close()
         SocketBase.close(self)
 
+    def _on_shards(self, method, endpoint, resolve):
+        if len(self._shards) == 1:
+            return getattr(self._events, method)(endpoint, resolve)
+        if isinstance(endpoint, (tuple, list)):
+            endpoints = endpoint
+        else:
+            endpoints = shard_endpoints(endpoint, len(self._shards))
+        if len(endpoints) != len(self._shards):
+            raise ValueError('expected {0} endpoints, one per shard, got '
+                             '{1}'.format(len(self._shards), len(endpoints)))
+        r = []
+        for events, endpoint_ in zip(self._shards, endpoints):
+            r.extend(getattr(events, method)(endpoint_, resolve))
+        return r
+
+    def connect(self, endpoint, resolve=True):
+        return self._on_shards('connect', endpoint, resolve)
+
+    def bind(self, endpoint, resolve=True):
+        r = self._on_shards('bind', endpoint, resolve)
+        if self._context.local_calls:
+            self._bind_local(endpoint, resolve)
+        return r
+
+    def _bind_local(self, endpoint, resolve):
+        # The clients of this context connecting to one of these endpoints
+        # will call us through a LocalEvents, served like another shard.
+        if len(self._shards) > 1 and not isinstance(endpoint, (tuple, list)):
+            endpoint = shard_endpoints(endpoint, len(self._shards))
+        for endpoint_ in self._events._resolve_endpoint(endpoint, resolve):
+            if not endpoint_.startswith('inproc://'):
+                continue
+            if self._local_events is None:
+                self._local_events = LocalEvents(self._context)
+                multiplexer = ChannelMultiplexer(self._local_events)
+                self._multiplexers.append(multiplexer)
+                if self._acceptor_task is not None:
+                    # run() only serves the multiplexers it started with.
+                    self._local_acceptor_task = gevent.spawn(self._acceptor,
+                            multiplexer)
+            self._context._local_servers[endpoint_] = self._local_events
+
+    def disconnect(self, endpoint, resolve=True):
+        return self._on_shards('disconnect', endpoint, resolve)
+
+    @property
+    def debug(self):
+        return self._events.debug
+
+    @debug.setter
+    def debug(self, v):
+        for events in self._shards:
+            events.debug = v
+
 
 class Client(SocketBase, ClientBase):
 
     def __init__(self, connect_to=None, context=None, timeout=30, heartbeat=5,
-            passive_heartbeat=False):
-        SocketBase.__init__(self, zmq.DEALER, context=context)
+            passive_heartbeat=False, method_ids=False, socket_options=None,
+            shards=1, zmtp_heartbeat=False):
+        SocketBase.__init__(self, zmq.DEALER, context=context,
+                socket_options=socket_options)
         ClientBase.__init__(self, self._events, context, timeout, heartbeat,
-                passive_heartbeat)
+                passive_heartbeat, method_ids)
+        if zmtp_heartbeat and heartbeat is not None:
+            self._events.use_zmtp_heartbeat(heartbeat)
+        self._shards = shards
+        self._local_events = None   # see Context.local_calls
         if connect_to:
             self.connect(connect_to)
 
     def close(self):
         ClientBase.close(self)
+        if self._local_events is not None:
+            self._local_events.close()
         SocketBase.close(self)
 
+    def connect(self, endpoint, resolve=True):
+        # The events of a channel must all reach the same server socket,
+        # hence a client of a Server(shards=n) connects to one of its
+        # shards, picked at random to spread the clients.
+        if self._shards > 1:
+            if not isinstance(endpoint, (tuple, list)):
+                endpoint = shard_endpoints(endpoint, self._shards)
+            endpoint = random.choice(endpoint)
+        if self._local_events is not None:
+            raise ValueError('a client calling a server of its context '
+                             'can\'t connect to other servers')
+        endpoints = self._events._resolve_endpoint(endpoint, resolve)
+        server = self._local_server(endpoints)
+        if server is not None:
+            self._local_events = LocalEvents(self._context, server)
+            self._multiplexer.close()
+            self._multiplexer = ChannelMultiplexer(self._local_events,
+                    ignore_broadcast=True)
+            return [None]
+        return SocketBase.connect(self, endpoints, resolve=False)
+
+    def disconnect(self, endpoint, resolve=True):
+        endpoints = self._events._resolve_endpoint(endpoint, resolve)
+        if self._local_events is not None and \
+                self._local_server(endpoints) is self._local_events._server:
+            self._multiplexer.close()
+            self._local_events.close()
+            self._local_events = None
+            self._multiplexer = ChannelMultiplexer(self._events,
+                    ignore_broadcast=True)
+            return [None]
+        return SocketBase.disconnect(self, endpoints, resolve=False)
+
+    def _local_server(self, endpoints):
+        # Only when the server is the only one we connect to.
+        if not self._context.local_calls or self._events._endpoints or \
+                len(endpoints) != 1:
+            return None
+        return self._context._local_servers.get(endpoints[0])
+
 
 class Pusher(SocketBase):
 
-    def __init__(self, context=None, zmq_socket=zmq.PUSH):
-        super(Pusher, self).__init__(zmq_socket, context=context)
+    def __init__(self, context=None, zmq_socket=zmq.PUSH, socket_options=None):
+        super(Pusher, self).__init__(zmq_socket, context=context,
+                socket_options=socket_options)
 
     def __call__(self, method, *args):
         self._events.emit(method, args,
@@ -336,8 +619,10 @@ class Pusher(SocketBase):
 
 class Puller(SocketBase):
 
-    def __init__(self, methods=None, context=None, zmq_socket=zmq.PULL):
-        super(Puller, self).__init__(zmq_socket, context=context)
+    def __init__(self, methods=None, context=None, zmq_socket=zmq.PULL,
+            socket_options=None):
+        super(Puller, self).__init__(zmq_socket, context=context,
+                socket_options=socket_options)
 
         if methods is None:
             methods = self
@@ -388,15 +673,16 @@ class Puller(SocketBase):
 
 class Publisher(Pusher):
 
-    def __init__(self, context=None):
-        super(Publisher, self).__init__(context=context, zmq_socket=zmq.PUB)
+    def __init__(self, context=None, socket_options=None):
+        super(Publisher, self).__init__(context=context, zmq_socket=zmq.PUB,
+                socket_options=socket_options)
 
 
 class Subscriber(Puller):
 
-    def __init__(self, methods=None, context=None):
+    def __init__(self, methods=None, context=None, socket_options=None):
         super(Subscriber, self).__init__(methods=methods, context=context,
-                zmq_socket=zmq.SUB)
+                zmq_socket=zmq.SUB, socket_options=socket_options)
         self._events.setsockopt(zmq.SUBSCRIBE, b'')      # 服务端订阅所有
 
 
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import absolute_import
+
+import struct
+import uuid
+import datetime
+import decimal
+
+import msgpack
+
+from .events import new_ext_hook, new_packer
+
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+try:
+    import dataclasses
+except ImportError:
+    dataclasses = None
+
+# msgpack ext type codes of the standard types, see register_standard_types().
+EXT_DATETIME = 3
+EXT_DECIMAL = 4
+EXT_UUID = 5
+# msgpack ext type code of Columnar, see register_columnar().
+EXT_COLUMNAR = 6
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+# Seconds and microseconds since the epoch, followed for an aware datetime by
+# its UTC offset in seconds.
+_naive_struct = struct.Struct('>qI')
+_aware_struct = struct.Struct('>qIi')
+
+
+def _encode_datetime(dt, attach):
+    offset = dt.utcoffset()
+    if offset is not None:
+        dt = dt.replace(tzinfo=None) - offset
+    delta = dt - _EPOCH
+    seconds = delta.days * 86400 + delta.seconds
+    if offset is None:
+        return _naive_struct.pack(seconds, delta.microseconds)
+    offset = offset.days * 86400 + offset.seconds
+    return _aware_struct.pack(seconds, delta.microseconds, offset)
+
+
+def _decode_datetime(data, frame):
+    if len(data) == _naive_struct.size:
+        (seconds, microseconds) = _naive_struct.unpack(data)
+        return _EPOCH + datetime.timedelta(seconds=seconds,
+                microseconds=microseconds)
+    (seconds, microseconds, offset) = _aware_struct.unpack(data)
+    offset = datetime.timedelta(seconds=offset)
+    dt = _EPOCH + datetime.timedelta(seconds=seconds,
+            microseconds=microseconds) + offset
+    return dt.replace(tzinfo=datetime.timezone(offset))
+
+
+def _encode_decimal(value, attach):
+    return str(value).encode('ascii')
+
+
+def _decode_decimal(data, frame):
+    return decimal.Decimal(bytes(data).decode('ascii'))
+
+
+def _encode_uuid(value, attach):
+    return value.bytes
+
+
+def _decode_uuid(data, frame):
+    return uuid.UUID(bytes=bytes(data))
+
+
+def register_standard_types(context):
+    """Send datetime, Decimal and UUID objects through context.
+
+    They travel as compact msgpack ext types: 12 bytes for a naive datetime,
+    16 for an aware one (which comes back with a fixed offset timezone), the
+    text of a Decimal and the 16 bytes of a UUID. Both ends must register
+    them.
+
+    """
+    context.register_ext_type(EXT_DATETIME, datetime.datetime,
+            _encode_datetime, _decode_datetime)
+    context.register_ext_type(EXT_DECIMAL, decimal.Decimal,
+            _encode_decimal, _decode_decimal)
+    context.register_ext_type(EXT_UUID, uuid.UUID, _encode_uuid, _decode_uuid)
+
+
+def _record_fields(cls):
+    if dataclasses is not None and dataclasses.is_dataclass(cls):
+        return [field.name for field in dataclasses.fields(cls)]
+    fields = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        fields.extend(slot for slot in slots
+                if slot not in ('__dict__', '__weakref__'))
+    if not fields:
+        raise ValueError('{0} is neither a dataclass nor a class with '
+            '__slots__, give its fields'.format(cls.__name__))
+    return fields
+
+
+class _NestedCodec(object):
+    """Base of the ext types packing their data with msgpack.
+
+    Registered types can nest in that data, out-of-band buffers included.
+    """
+
+    def __init__(self, context):
+        self._context = context
+        # Values can nest, a Packer is only reused once released.
+        self._packers = []
+
+    def _new_packer(self):
+        # The Packer outlives the attach function of a single call.
+        current = [None]
+        packer = new_packer(self._context, lambda buf: current[0](buf))
+        return (packer, current)
+
+    def _pack(self, values, attach):
+        packers = self._packers
+        (packer, current) = packers.pop() if packers else self._new_packer()
+        current[0] = attach
+        try:
+            return packer.pack(values)
+        finally:
+            current[0] = None
+            packers.append((packer, current))
+
+    def _unpack(self, data, frame):
+        return msgpack.unpackb(data, raw=False,
+                ext_hook=new_ext_hook(self._context, frame))
+
+
+class _RecordCodec(_NestedCodec):
+    """Encodes the instances of a class as the tuple of their fields."""
+
+    def __init__(self, context, cls, fields):
+        super(_RecordCodec, self).__init__(context)
+        self._cls = cls
+        self._fields = tuple(fields)
+
+    def encode(self, obj, attach):
+        return self._pack(tuple(getattr(obj, field)
+            for field in self._fields), attach)
+
+    def decode(self, data, frame):
+        values = self._unpack(data, frame)
+        obj = self._cls.__new__(self._cls)
+        for (field, value) in zip(self._fields, values):
+            object.__setattr__(obj, field, value)
+        return obj
+
+
+def register_record_type(context, cls, code, fields=None):
+    """Send the instances of cls through context as positional tuples.
+
+    cls is a dataclass or a class with __slots__, unless fields lists the
+    attributes to send. Only the values of the fields travel, in order,
+    nested registered types included. The remote rebuilds the object without
+    calling its __init__. Both ends must register cls with the same code.
+
+    """
+    if fields is None:
+        fields = _record_fields(cls)
+    codec = _RecordCodec(context, cls, fields)
+    context.register_ext_type(code, cls, codec.encode, codec.decode)
+    return codec
+
+
+class Columnar(object):
+    """A list of dicts sharing the same keys, sent column by column.
+
+    Returned by a method (or anywhere in args), the keys are sent once,
+    followed by the list of the values of each key, see register_columnar().
+    keys defaults to the keys of the first row, every row must have exactly
+    these keys.
+
+    """
+
+    __slots__ = ['rows', 'keys']
+
+    def __init__(self, rows, keys=None):
+        self.rows = rows
+        self.keys = keys
+
+
+class ColumnarRows(Sequence):
+    """A read-only list of dicts, each built when accessed.
+
+    The columns attribute maps each key to the list of its values.
+    """
+
+    def __init__(self, keys, columns, length):
+        self.keys = keys
+        self.columns = dict(zip(keys, columns))
+        self._columns = columns
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('row index out of range')
+        return dict(zip(self.keys, [column[index] for column in self._columns]))
+
+    def __iter__(self):
+        if not self.keys:
+            return iter([{} for i in range(self._length)])
+        keys = self.keys
+        return (dict(zip(keys, row)) for row in zip(*self._columns))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ColumnarRows({0!r})'.format(list(self))
+
+
+class _ColumnarCodec(_NestedCodec):
+
+    def __init__(self, context, lazy):
+        super(_ColumnarCodec, self).__init__(context)
+        self._lazy = lazy
+
+    def encode(self, columnar, attach):
+        rows = columnar.rows
+        keys = columnar.keys
+        if keys is None:
+            keys = list(rows[0]) if rows else []
+        width = len(keys)
+        for row in rows:
+            if len(row) != width:
+                raise ValueError('Columnar rows must all have the keys '
+                    '{0!r}, got {1!r}'.format(keys, list(row)))
+        columns = [[row[key] for row in rows] for key in keys]
+        return self._pack([len(rows), keys] + columns, attach)
+
+    def decode(self, data, frame):
+        values = self._unpack(data, frame)
+        (length, keys, columns) = (values[0], values[1], values[2:])
+        if self._lazy:
+            return ColumnarRows(keys, columns, length)
+        if not keys:
+            return [{} for i in range(length)]
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def register_columnar(context, lazy=False, code=EXT_COLUMNAR):
+    """Send Columnar lists of dicts through context, column by column.
+
+    The remote gets back a list of dicts, or a ColumnarRows building each
+    row when accessed if lazy is set. Both ends must register it.
+
+    """
+    codec = _ColumnarCodec(context, lazy)
+    context.register_ext_type(code, Columnar, codec.encode, codec.decode)
+    return codec
@@ -28,18 +28,23 @@ from builtins import str
 from builtins import range
 
 import msgpack
+from zmq.utils.monitor import recv_monitor_message
 import gevent.pool
 import gevent.queue
 import gevent.event
 import gevent.local
 import gevent.lock
+import collections
+import errno
 import logging
+import struct
 import sys
 
 from . import gevent_zmq as zmq
 from .exceptions import TimeoutExpired
 from .context import Context
 from .channel_base import ChannelBase
+from .compression import compress, decompress
 
 
 if sys.version_info < (2, 7):
@@ -54,8 +59,58 @@ if sys.version_info >= (3, 0) and gevent.version_info <= (1, 1, 0, 'rc', '5'):
     setattr(gevent.queue.Channel, '__next__', gevent.queue.Channel.next)
 
 
+def _frame_buffer(part):
+    # Received parts are zmq.Frames, reassembled ones memoryviews.
+    if isinstance(part, zmq.Frame):
+        return get_pyzmq_frame_buffer(part)
+    return part
+
+
+def _byte_view(part):
+    view = memoryview(part)
+    if view.ndim != 1 or view.itemsize != 1:
+        view = view.cast('B')
+    return view
+
+
+def _nbytes(part):
+    # A message part is bytes, a zmq.Frame, or any buffer (memoryview,
+    # numpy array...) of which len() may not be the size in bytes.
+    nbytes = getattr(part, 'nbytes', None)
+    return len(part) if nbytes is None else nbytes
+
+
 logger = logging.getLogger(__name__)
 
+# msgpack ext type referencing an out-of-band frame, see Context.oob_threshold.
+EXT_FRAME = 1
+
+
+def _extract_frames(obj, threshold, frames):
+    """Replace the large bytes-like objects of obj by references to frames.
+
+    The i-th frame will be sent i frames before the body of the event, hence
+    the references can be resolved without knowing how many frames there are.
+    """
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        size = obj.nbytes if isinstance(obj, memoryview) else len(obj)
+        if size < threshold:
+            return obj
+        frames.append(obj)
+        return msgpack.ExtType(EXT_FRAME, struct.pack('>I', len(frames) - 1))
+    if isinstance(obj, (tuple, list)):
+        items = [_extract_frames(x, threshold, frames) for x in obj]
+        if any(x is not y for x, y in zip(items, obj)):
+            return items
+        return obj
+    if isinstance(obj, dict):
+        items = dict((k, _extract_frames(v, threshold, frames))
+                for k, v in obj.items())
+        if any(items[k] is not v for k, v in obj.items()):
+            return items
+        return obj
+    return obj
+
 
 class SequentialSender(object):
 
@@ -79,7 +134,7 @@ class SequentialSender(object):
         if e:
             raise e
 
-    def __call__(self, parts, timeout=None):
+    def __call__(self, parts, timeout=None, priority=False, key=None):
         if timeout:
             with gevent.Timeout(timeout):
                 self._send(parts)
@@ -117,33 +172,149 @@ class SequentialReceiver(object):
             return self._recv()
 
 
+class _Queued(object):
+    """A message waiting for the sender greenlet."""
+
+    __slots__ = ['parts', 'size', 'taken']
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.size = sum(_nbytes(part) for part in parts)
+        self.taken = gevent.event.Event()
+
+
 class Sender(SequentialSender):
 
+    # Send from the calling greenlet when nothing is waiting to be sent,
+    # instead of switching to the sender greenlet and back.
+    direct_send = True
+
+    # The messages waiting to be sent are queued by key (channel), and the
+    # queues are served by deficit round-robin: while several queues have
+    # messages waiting, each one sends up to this many bytes per round.
+    quantum = 64 * 1024
+
     def __init__(self, socket):
         self._socket = socket
-        self._send_queue = gevent.queue.Channel()   # gevent.queue.Channel 是 gevent.queue.Queue(0) 的代替，因为Queue 是通道 而 Queue(0) 会导致阻塞，所以要使用 Channel()
+        self._queues = {}    # key -> deque of _Queued
+        self._deficits = {}  # key -> bytes the queue may send this round
+        self._active = collections.deque()  # keys of the queues, round-robin
+        # Control events overtaking the messages waiting in _queues.
+        self._priority_queue = collections.deque()
+        self._wakeup = gevent.event.Event()
+        self._pending = 0    # messages queued or being sent by the sender greenlet
         self._send_task = gevent.spawn(self._sender)
 
     def close(self):
         if self._send_task:
             self._send_task.kill()
 
-    def _sender(self):
-        for parts in self._send_queue:        # 这个循环不会结束，队列中没有值后会阻塞等待
-            super(Sender, self)._send(parts)
+    def _next(self):
+        while True:
+            if self._priority_queue:
+                return self._priority_queue.popleft()
+            if self._active:
+                return self._next_fair()
+            self._wakeup.clear()
+            self._wakeup.wait()               # 队列中没有值后会阻塞等待
+
+    def _next_fair(self):
+        active = self._active
+        while True:
+            key = active[0]
+            queue = self._queues[key]
+            queued = queue[0]
+            if len(active) > 1 and self._deficits[key] < queued.size:
+                self._deficits[key] += self.quantum
+                active.rotate(-1)
+                continue
+            queue.popleft()
+            if queue:
+                self._deficits[key] -= queued.size
+            else:
+                self._remove_queue(key)
+            queued.taken.set()
+            return queued.parts
+
+    def _remove_queue(self, key):
+        del self._queues[key]
+        del self._deficits[key]
+        self._active.remove(key)
+
+    def _cancel(self, key, queued):
+        if queued.taken.is_set():
+            return
+        queue = self._queues[key]
+        queue.remove(queued)
+        if not queue:
+            self._remove_queue(key)
+        self._pending -= 1
 
-    def __call__(self, parts, timeout=None):
+    def _sender(self):
+        while True:
+            parts = self._next()
+            try:
+                super(Sender, self)._send(parts)
+            finally:
+                self._pending -= 1
+
+    def _send_now(self, parts):
+        # Once ZMQ accepted the first part of a message without blocking, it
+        # accepts the others the same way: a message is sent whole or not at
+        # all, and then it is up to the sender greenlet.
+        last = len(parts) - 1
         try:
-            self._send_queue.put(parts, timeout=timeout)
-        except gevent.queue.Full:
+            self._socket.send(parts[0], copy=False,
+                    flags=zmq.NOBLOCK | (zmq.SNDMORE if last else 0))
+        except zmq.ZMQError as e:
+            if e.errno not in (zmq.EAGAIN, errno.EINTR):
+                raise
+            return False
+        for i in range(1, last + 1):
+            self._socket.send(parts[i], copy=False,
+                    flags=zmq.NOBLOCK | (zmq.SNDMORE if i < last else 0))
+        return True
+
+    def __call__(self, parts, timeout=None, priority=False, key=None):
+        # Messages of a given key are sent in order, only an idle sender can
+        # be bypassed. Priority messages (heartbeats, flow control) only wait
+        # for the message being sent, if any.
+        if self.direct_send and self._pending == 0 and self._send_now(parts):
+            return
+        self._pending += 1
+        self._wakeup.set()
+        if priority:
+            self._priority_queue.append(parts)
+            return
+        queued = _Queued(parts)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = collections.deque()
+            self._deficits[key] = 0
+            self._active.append(key)
+        queue.append(queued)
+        # Return once the sender greenlet took the message, so that a slow
+        # peer slows the emitters down.
+        try:
+            taken = queued.taken.wait(timeout)
+        except BaseException:
+            self._cancel(key, queued)
+            raise
+        if not taken:
+            self._cancel(key, queued)
             raise TimeoutExpired(timeout)
 
 
 class Receiver(SequentialReceiver):
 
+    # Messages received but not handed over yet, at most. Every message
+    # available is drained at each wake-up of the receiver greenlet, until
+    # this buffer is full.
+    buffer_size = 1024
+
     def __init__(self, socket):
         self._socket = socket
-        self._recv_queue = gevent.queue.Channel()
+        self._recv_queue = gevent.queue.Queue(self.buffer_size)
         self._recv_task = gevent.spawn(self._recver)
 
     def close(self):
@@ -151,10 +322,30 @@ class Receiver(SequentialReceiver):
             self._recv_task.kill()
         self._recv_queue = None
 
+    def _recv_now(self):
+        # The parts of a message arrive together, only the first one can be
+        # missing.
+        try:
+            part = self._socket.recv(copy=False, flags=zmq.NOBLOCK)
+        except zmq.ZMQError as e:
+            if e.errno not in (zmq.EAGAIN, errno.EINTR):
+                raise
+            return None
+        parts = [part]
+        while part.more:
+            part = self._socket.recv(copy=False, flags=zmq.NOBLOCK)
+            parts.append(part)
+        return parts
+
     def _recver(self):
+        recv_queue = self._recv_queue
         while True:
             parts = super(Receiver, self)._recv()
-            self._recv_queue.put(parts)
+            # Queue.put() only switches to another greenlet when the buffer
+            # is full, the readers get the whole batch once we wait again.
+            while parts is not None:
+                recv_queue.put(parts)
+                parts = self._recv_now()
 
     def __call__(self, timeout=None):
         try:
@@ -163,12 +354,225 @@ class Receiver(SequentialReceiver):
             raise TimeoutExpired(timeout)
 
 
+# Protocol v4 header: [4, message_id, response_to, key, value, ...] where the
+# well known keys are interned as their index in this tuple. Only append to it.
+_V4_KEYS = (u'codec', u'codecs', u'frames', u'vmax', u'compression', u'zdict',
+        u'chunked', u'mtab', u'bundle', u'frag', u'zmtp_hb')
+_V4_KEY_IDS = dict((k, i) for i, k in enumerate(_V4_KEYS))
+_V4_FIXED_KEYS = (u'v', u'message_id', u'response_to')
+
+# What Events watches with Context.monitor_peers.
+_MONITORED_EVENTS = zmq.EVENT_DISCONNECTED | zmq.EVENT_CLOSED
+for _name in ('EVENT_HANDSHAKE_FAILED_NO_DETAIL',
+        'EVENT_HANDSHAKE_FAILED_PROTOCOL', 'EVENT_HANDSHAKE_FAILED_AUTH'):
+    _MONITORED_EVENTS |= getattr(zmq, _name, 0)
+
+# Heartbeats and flow control, sent ahead of the other events (and never
+# bundled) so that large events can't delay them.
+_CONTROL_EVENTS = frozenset((u'_zpc_hb', u'_zpc_more'))
+
+
+def _compact_header(header):
+    # _expand_header() gives back a v4 header, which means the same as a v3
+    # one. Older versions are legacy paths of their own, their header stays
+    # as it is.
+    if header.get(u'v', 1) < 3:
+        return header
+    compact = [4, header.get(u'message_id'), header.get(u'response_to')]
+    for (k, v) in header.items():
+        if k not in _V4_FIXED_KEYS:
+            compact.append(_V4_KEY_IDS.get(k, k))
+            compact.append(v)
+    return compact
+
+
+def _expand_header(compact):
+    header = {u'v': 4, u'message_id': compact[1]}
+    if compact[2] is not None:
+        header[u'response_to'] = compact[2]
+    for i in range(3, len(compact) - 1, 2):
+        k = compact[i]
+        if isinstance(k, int) and k < len(_V4_KEYS):
+            k = _V4_KEYS[k]
+        header[k] = compact[i + 1]
+    return header
+
+
+def _unpackb(blob, ext_hook=None):
+    # unpackb works directly on any buffer (bytes, memoryview over a
+    # zmq.Frame...), contrary to Unpacker.feed() which copies it first.
+    try:
+        if ext_hook is None:
+            return msgpack.unpackb(blob, raw=False)
+        return msgpack.unpackb(blob, raw=False, ext_hook=ext_hook)
+    except msgpack.ExtraData as e:
+        return e.unpacked
+
+
+class _ExtHook(object):
+    """Decodes the msgpack ext types of a received event.
+
+    Out-of-band frames are handed back as memoryviews over the received
+    frames, without copy.
+    """
+
+    __slots__ = ['_context', '_frames']
+
+    def __init__(self, context, frames):
+        self._context = context
+        self._frames = frames
+
+    def frame(self, index):
+        frame = self._frames[-1 - index]
+        if isinstance(frame, (bytes, memoryview)):
+            return memoryview(frame)
+        return get_pyzmq_frame_buffer(frame)
+
+    def __call__(self, code, data):
+        if code == EXT_FRAME and self._frames:
+            return self.frame(struct.unpack('>I', data)[0])
+        if self._context is not None:
+            decode = self._context.get_ext_decoder(code)
+            if decode is not None:
+                return decode(data, self.frame)
+        return msgpack.ExtType(code, data)
+
+
+class _LazyArgs(object):
+    """The not yet decoded args of an Event."""
+
+    __slots__ = ['_args', '_packed', '_ext_hook', '_codec_decode',
+            '_compressed', '_zdict']
+
+    def __init__(self, args, packed, ext_hook, codec_decode, compressed=False,
+            zdict=None):
+        self._args = args
+        self._packed = packed
+        self._ext_hook = ext_hook
+        self._codec_decode = codec_decode
+        self._compressed = compressed
+        self._zdict = zdict
+
+    def __call__(self):
+        args = self._args
+        if self._packed:
+            args = _unpackb(args, self._ext_hook)
+        if self._compressed:
+            args = _unpackb(decompress(args, self._zdict), self._ext_hook)
+        if self._codec_decode is not None:
+            args = self._codec_decode(args)
+        return args
+
+
+_args_packer = msgpack.Packer(use_bin_type=True)
+
+
+def new_packer(context, attach=None):
+    """A msgpack Packer encoding the ext types registered on the context.
+
+    attach(buffer) is called for the buffers attached by the ext types (see
+    Context.register_ext_type()), the Packer refuses them when it is None.
+
+    """
+    def refuse(buf):
+        raise TypeError('can not attach an out-of-band buffer here')
+
+    def default(obj):
+        entry = context.get_ext_encoder(obj) if context is not None else None
+        if entry is None:
+            raise TypeError('can not serialize {0!r} object'.format(
+                type(obj).__name__))
+        (code, encode) = entry
+        return msgpack.ExtType(code, encode(obj, attach or refuse))
+    return msgpack.Packer(use_bin_type=True, default=default)
+
+
+def pack_args(args, context=None):
+    """Pack args on their own, outside of any event.
+
+    Returns the msgpack blob and the buffers attached by the ext types
+    registered on the context, or sent out-of-band as Events would (see
+    Context.oob_threshold), in order. unpack_args() reverses it.
+
+    """
+    frames = []
+    threshold = context.oob_threshold if context is not None else None
+    if threshold is not None:
+        args = _extract_frames(args, threshold, frames)
+    if context is None or not context.ext_types_registered:
+        return (_args_packer.pack(args), frames)
+
+    def attach(buf):
+        frames.append(buf)
+        return len(frames) - 1
+    return (new_packer(context, attach).pack(args), frames)
+
+
+def new_ext_hook(context, frame):
+    """An ext_hook for msgpack decoding the ext types of the context.
+
+    For ext types nested in the data of another one, see
+    Context.register_ext_type(): frame is the function its decoder gets.
+
+    """
+    def ext_hook(code, data):
+        if code == EXT_FRAME:
+            return frame(struct.unpack('>I', data)[0])
+        decode = context.get_ext_decoder(code)
+        if decode is not None:
+            return decode(data, frame)
+        return msgpack.ExtType(code, data)
+    return ext_hook
+
+
+def new_unpacker(context=None):
+    """A streaming msgpack Unpacker decoding the ext types of the context.
+
+    There are no out-of-band frames here, see new_packer().
+
+    """
+    if context is not None and context.ext_types_registered:
+        return msgpack.Unpacker(raw=False, ext_hook=_ExtHook(context, ()))
+    return msgpack.Unpacker(raw=False)
+
+
+class PackedArgs(object):
+    """Args already packed by pack_args(), spliced as is by Event.pack().
+
+    prefix goes before blob, for instance the header of an array wrapping it.
+    """
+
+    __slots__ = ['blob', 'frames', 'prefix']
+
+    def __init__(self, blob, frames=(), prefix=b''):
+        self.blob = blob
+        self.frames = frames
+        self.prefix = prefix
+
+    def join(self):
+        if self.prefix:
+            return b''.join((self.prefix, self.blob))
+        return self.blob
+
+
+def unpack_args(blob, frames=(), context=None):
+    ext_hook = None
+    if frames or (context is not None and context.ext_types_registered):
+        ext_hook = _ExtHook(context, list(reversed(frames)))
+    return _unpackb(blob, ext_hook)
+
+
 class Event(object):
 
-    __slots__ = ['_name', '_args', '_header', '_identity']
+    __slots__ = ['_name', '_args', '_header', '_identity', '_payload']
+
+    # Events larger than this are decoded in two steps: the header and the
+    # name first, the args when accessed.
+    lazy_unpack_size = 1024
 
     # protocol details:
-    #  - `name` and `header` keys must be unicode strings.
+    #  - `name` and `header` keys must be unicode strings, the name of a
+    #    request can also be the integer id of a method (see ClientBase).
     #  - `message_id` and 'response_to' values are opaque bytes string.
     #  - `v' value is an integer.
     def __init__(self, name, args, context, header=None):
@@ -179,6 +583,7 @@ class Event(object):
         else:
             self._header = header
         self._identity = None
+        self._payload = None
 
     @property
     def header(self):
@@ -194,8 +599,16 @@ class Event(object):
 
     @property
     def args(self):
+        if self._payload is not None:
+            self._args = self._payload()
+            self._payload = None
         return self._args
 
+    @args.setter
+    def args(self, v):
+        self._args = v
+        self._payload = None
+
     @property
     def identity(self):
         return self._identity
@@ -204,36 +617,128 @@ class Event(object):
     def identity(self, v):
         self._identity = v
 
-    def pack(self):    # 序列化
-        payload = (self._header, self._name, self._args)
-        r = msgpack.Packer(use_bin_type=True).pack(payload)
-        return r
+    def pack(self, packer=None, encode=None, frames=None, compact=False,
+            compress=None):    # 序列化
+        # Building a Packer is not free, Events hands us its own so that it
+        # can be reused from one event to the next.
+        if packer is None:
+            packer = msgpack.Packer(use_bin_type=True)
+        args = self.args
+        packed = isinstance(args, PackedArgs)
+        if packed:
+            if args.frames:
+                frames.extend(args.frames)
+        elif encode is not None:
+            # A negotiated codec, see Context.register_serializer(). The
+            # header tells the remote which one was used.
+            args = encode(args)
+        if not packed and frames is None and compress is None:
+            header = _compact_header(self._header) if compact else self._header
+            return packer.pack((header, self._name, args))
+        # Packing the args can attach out-of-band frames (see Events), which
+        # must be counted in the header, and compressing them flags the
+        # header too, hence the header is packed last.
+        if packed:
+            parts = (args.prefix, args.blob)
+        else:
+            parts = (packer.pack(args),)
+        if frames:
+            self._header[u'frames'] = len(frames)
+        if compress is not None:
+            parts = (compress(b''.join(parts), self._header, packer),)
+        header = _compact_header(self._header) if compact else self._header
+        return b''.join((b'\x93', packer.pack(header),
+            packer.pack(self._name)) + parts)
 
     @staticmethod
-    def unpack(blob):   # 反序列化
-        unpacker = msgpack.Unpacker(raw=False)
-        unpacker.feed(blob)
-        unpacked_msg = unpacker.unpack()
+    def _unpack_head(view):
+        # Only the header and the name are decoded here, from a prefix of the
+        # blob large enough to hold them. This prefix is the only copy made.
+        size = 256
+        while True:
+            unpacker = msgpack.Unpacker(raw=False)
+            unpacker.feed(view[:size])
+            try:
+                length = unpacker.read_array_header()
+                if length != 3:
+                    raise ValueError('expected 3 items, got {0}'.format(length))
+                header = unpacker.unpack()
+                name = unpacker.unpack()
+                return (header, name, unpacker.tell())
+            except msgpack.OutOfData:
+                if size >= len(view):
+                    raise ValueError('truncated event')
+                size *= 4
 
+    @staticmethod
+    def unpack(blob, context=None, frames=None):   # 反序列化
+        # frames are the parts received before blob (see Events.recv).
+        if frames or (context is not None and context.ext_types_registered):
+            ext_hook = _ExtHook(context, frames)
+        else:
+            ext_hook = None
+        view = memoryview(blob)
         try:
-            (header, name, args) = unpacked_msg
+            if len(view) <= Event.lazy_unpack_size:
+                # Decoding a small event at once is cheaper than in two steps.
+                (header, name, args) = _unpackb(view, ext_hook)
+                lazy = False
+            else:
+                (header, name, offset) = Event._unpack_head(view)
+                args = view[offset:]
+                lazy = True
         except Exception as e:
-            raise Exception('invalid msg format "{0}": {1}'.format(
-                unpacked_msg, e))
+            raise Exception('invalid msg format "{0!r}": {1}'.format(
+                view[:64].tobytes(), e))
 
-        # Backward compatibility
-        if not isinstance(header, dict):
+        if isinstance(header, list) and header and header[0] == 4:
+            header = _expand_header(header)
+        elif not isinstance(header, dict):
+            # Backward compatibility
             header = {}
 
-        return Event(name, args, None, header)
+        codec_decode = None
+        codec = header.get(u'codec')
+        if codec is not None and codec != u'msgpack':
+            try:
+                codec_decode = context.get_serializer(codec)[1]
+            except (AttributeError, KeyError):
+                raise Exception('unsupported codec "{0}"'.format(codec))
+
+        compressed = False
+        zdict = None
+        compression = header.get(u'compression')
+        if compression is not None:
+            if compression != u'zlib':
+                raise Exception('unsupported compression "{0}"'.format(
+                    compression))
+            compressed = True
+            dict_id = header.get(u'zdict')
+            if dict_id is not None:
+                try:
+                    zdict = context.get_compression_dictionary(dict_id)
+                except (AttributeError, KeyError):
+                    raise Exception('unknown compression dictionary "{0}"'.format(
+                        dict_id))
+
+        event = Event(name, args, None, header)
+        if lazy or compressed or codec_decode is not None:
+            # The args are only decoded when accessed, routing an event or
+            # handling the control events never pays for it.
+            event._payload = _LazyArgs(args, lazy, ext_hook, codec_decode,
+                    compressed, zdict)
+        return event
 
     def __str__(self, ignore_args=False):
         if ignore_args:
             args = '[...]'
         else:
-            args = self._args
             try:
-                args = '<<{0}>>'.format(str(self.unpack(self._args)))
+                args = self.args
+            except Exception:
+                args = '<undecodable args>'
+            try:
+                args = '<<{0}>>'.format(str(self.unpack(args)))
             except Exception:
                 pass
         if self._identity:
@@ -243,12 +748,87 @@ class Event(object):
         return '{0} {1} {2}'.format(self._name, self._header, args)
 
 
+class _Peer(object):
+    """What has been negotiated with the remote end of a connection."""
+
+    __slots__ = ['codec', 'answer', 'v4', 'bundle', 'bundle_answer', 'frag',
+            'frag_answer', 'zmtp_hb', 'zmtp_hb_answer']
+
+    def __init__(self):
+        self.codec = None     # codec used for the args sent to this peer
+        self.answer = False   # the peer is still waiting for our choice
+        self.v4 = False       # the peer talks the compact protocol
+        self.bundle = False   # the peer unbundles events
+        self.bundle_answer = False  # the peer is still waiting to know we do
+        self.frag = False     # the peer reassembles fragmented events
+        self.frag_answer = False    # the peer is still waiting to know we do
+        self.zmtp_hb = False  # the peer does ZMTP heartbeats
+        self.zmtp_hb_answer = False  # the peer is still waiting to know we do
+
+
+class _Fragments(object):
+    """The frames of a fragmented event being received."""
+
+    __slots__ = ['sizes', 'buffer', 'offset']
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.buffer = bytearray(sum(sizes))
+        self.offset = 0
+
+    def add(self, piece):
+        """Add the next piece, return the frames once they are complete."""
+        end = self.offset + len(piece)
+        self.buffer[self.offset:end] = piece
+        self.offset = end
+        if end < len(self.buffer):
+            return None
+        view = memoryview(self.buffer)
+        frames = []
+        offset = 0
+        for size in self.sizes:
+            frames.append(view[offset:offset + size])
+            offset += size
+        return frames
+
+
+class _Bundle(object):
+    """Events waiting to be sent to a peer in a single message."""
+
+    __slots__ = ['prefix', 'blobs', 'size']
+
+    def __init__(self, prefix):
+        self.prefix = prefix  # the identity and delimiter parts
+        self.blobs = []
+        self.size = 0
+
+
 class Events(ChannelBase):
+
+    # How many ROUTER peers to remember, forgetting a peer only costs a new
+    # negotiation.
+    max_peers = 4096
+
     def __init__(self, zmq_socket_type, context=None):
         self._debug = False
         self._zmq_socket_type = zmq_socket_type           # default zeromq.ROUTER
         self._context = context or Context.get_instance()   # Context 单例模式
         self._socket = self._context.socket(zmq_socket_type)    # 这里执行的是 zmq.Context().socket
+        self._packer = msgpack.Packer(use_bin_type=True,
+                default=self._pack_default)
+        self._packing_frames = None
+        self._peers = {}
+        self._bundles = {}
+        self._unbundled = collections.deque()
+        self._fragment_id = 0
+        self._fragments = {}  # (peer, fragment id) -> _Fragments
+        self._lost_peer_handlers = []
+        self._endpoints = 0   # connected to
+        self._peer_fds = {}   # ROUTER: file descriptor -> peer
+        self._monitor_task = None
+        self._zmtp_heartbeat = False
+        if self._context.monitor_peers:
+            self._watch_peers()
 
         if zmq_socket_type in (zmq.PUSH, zmq.PUB, zmq.DEALER, zmq.ROUTER):
             self._send = Sender(self._socket)            # 有队列的发送（协程？？）
@@ -275,11 +855,20 @@ class Events(ChannelBase):
     def __del__(self):
         try:
             if not self._socket.closed:
-                self.close()
+                if gevent.getcurrent() is gevent.get_hub():
+                    # Collected from an event loop callback, which can't
+                    # wait for the greenlets to be killed.
+                    gevent.spawn(self.close)
+                else:
+                    self.close()
         except (AttributeError, TypeError):
             pass
 
     def close(self):
+        if self._monitor_task is not None:
+            self._socket.disable_monitor()
+            self._monitor_task.kill()
+            self._monitor_task = None
         try:
             self._send.close()
         except (AttributeError, TypeError, gevent.GreenletExit):
@@ -317,6 +906,7 @@ class Events(ChannelBase):
         r = []
         for endpoint_ in self._resolve_endpoint(endpoint, resolve):
             r.append(self._socket.connect(endpoint_))    # 连接
+            self._endpoints += 1
             logger.debug('connected to %s (status=%s)', endpoint_, r[-1])
         return r
 
@@ -331,6 +921,7 @@ class Events(ChannelBase):
         r = []
         for endpoint_ in self._resolve_endpoint(endpoint, resolve):
             r.append(self._socket.disconnect(endpoint_))
+            self._endpoints -= 1
             logger.debug('disconnected from %s (status=%s)', endpoint_, r[-1])
         return r
 
@@ -340,33 +931,417 @@ class Events(ChannelBase):
             event.header.update(xheader)   # get_task_context() 钩子返回的header update 到原始的里面
         return event
 
+    def _peer_key(self, identity):
+        # A DEALER talks to a single server (see doc/protocol.md), while a
+        # ROUTER tells its peers apart by their identity.
+        if self._zmq_socket_type != zmq.ROUTER or not identity:
+            return None
+        return tuple(getattr(x, 'bytes', x) for x in identity)
+
+    def _get_peer(self, key):
+        peer = self._peers.get(key)
+        if peer is None:
+            if len(self._peers) >= self.max_peers:
+                self._peers.pop(next(iter(self._peers)))
+            peer = self._peers[key] = _Peer()
+        return peer
+
+    def _negotiate_send(self, event):
+        """Apply what was negotiated with the peer to event.
+
+        Returns (encode, compact): the encoder of the codec of the args and
+        whether to use the compact protocol (v4).
+        """
+        if self._zmq_socket_type not in (zmq.DEALER, zmq.ROUTER):
+            return (None, False)
+        peer = self._peers.get(self._peer_key(event.identity))
+        dealer = self._zmq_socket_type == zmq.DEALER
+        if self._context.bundle_events:
+            if dealer and (peer is None or not peer.bundle):
+                event.header[u'bundle'] = True
+            elif not dealer and peer is not None and peer.bundle_answer:
+                event.header[u'bundle'] = True
+        if self._context.fragment_size is not None:
+            if dealer and (peer is None or not peer.frag):
+                event.header[u'frag'] = True
+            elif not dealer and peer is not None and peer.frag_answer:
+                event.header[u'frag'] = True
+        if self._zmtp_heartbeat:
+            # A DEALER only tells when a lost connection is its single one,
+            # and on the events opening a channel, see zmtp_heartbeat().
+            answered = peer is not None and peer.zmtp_hb
+            opening = u'response_to' not in event.header
+            if dealer and self._endpoints == 1 and (opening or not answered):
+                event.header[u'zmtp_hb'] = True
+            elif not dealer and peer is not None and peer.zmtp_hb_answer:
+                event.header[u'zmtp_hb'] = True
+        if peer is None or not peer.v4:
+            if dealer and self._context.compact_protocol:
+                event.header[u'vmax'] = 4
+            compact = False
+        else:
+            compact = True
+        if peer is None or peer.codec is None:
+            if dealer:
+                codecs = self._context.serializers
+                if len(codecs) > 1:
+                    event.header[u'codecs'] = codecs
+            return (None, compact)
+        if peer.codec != u'msgpack' or peer.answer:
+            event.header[u'codec'] = peer.codec
+        return (self._context.get_serializer(peer.codec)[0], compact)
+
+    def _negotiate_recv(self, event):
+        if self._zmq_socket_type not in (zmq.DEALER, zmq.ROUTER):
+            return
+        header = event.header
+        key = self._peer_key(event.identity)
+        peer = self._peers.get(key)
+        if self._context.bundle_events:
+            router = self._zmq_socket_type == zmq.ROUTER
+            if header.get(u'bundle'):
+                peer = self._get_peer(key)
+                peer.bundle = True
+                peer.bundle_answer = router
+            elif peer is not None:
+                peer.bundle_answer = False
+        if self._context.fragment_size is not None:
+            if header.get(u'frag'):
+                peer = self._get_peer(key)
+                peer.frag = True
+                peer.frag_answer = self._zmq_socket_type == zmq.ROUTER
+            elif peer is not None:
+                peer.frag_answer = False
+        if self._zmtp_heartbeat:
+            if header.get(u'zmtp_hb'):
+                peer = self._get_peer(key)
+                peer.zmtp_hb = True
+                peer.zmtp_hb_answer = self._zmq_socket_type == zmq.ROUTER
+            elif peer is not None:
+                peer.zmtp_hb_answer = False
+        if self._context.compact_protocol and (peer is None or not peer.v4):
+            # A v4 event is its own answer to our advertisement.
+            router = self._zmq_socket_type == zmq.ROUTER
+            if header.get(u'v') == 4 or (router and header.get(u'vmax', 3) >= 4):
+                peer = self._get_peer(key)
+                peer.v4 = True
+        codecs = header.get(u'codecs')
+        if codecs is not None and self._zmq_socket_type == zmq.ROUTER:
+            peer = self._get_peer(key)
+            peer.codec = next((c for c in self._context.serializers
+                if c in codecs), u'msgpack')
+            peer.answer = True
+            return
+        if peer is not None:
+            peer.answer = False
+        codec = header.get(u'codec')
+        if codec is not None:
+            self._get_peer(key).codec = codec
+
+    def _pack_default(self, obj):
+        # Called by msgpack for the types it doesn't know about.
+        frames = self._packing_frames
+        entry = self._context.get_ext_encoder(obj) if frames is not None else None
+        if entry is None:
+            raise TypeError('can not serialize {0!r} object'.format(
+                type(obj).__name__))
+        (code, encode) = entry
+
+        def attach(buf):
+            frames.append(buf)
+            return len(frames) - 1
+        return msgpack.ExtType(code, encode(obj, attach))
+
+    def _compress(self, args, header, packer):
+        # args is the packed args of an event, returns what to pack instead.
+        if len(args) < self._context.compress_threshold:
+            return args
+        dict_id = self._context.compression_dictionary
+        zdict = None
+        if dict_id is not None:
+            zdict = self._context.get_compression_dictionary(dict_id)
+        compressed = compress(args, zdict)
+        if len(compressed) >= len(args):
+            return args
+        header[u'compression'] = u'zlib'
+        if dict_id is not None:
+            header[u'zdict'] = dict_id
+        return packer.pack(compressed)
+
     def emit_event(self, event, timeout=None):  # 发送 消息
+        (encode, compact) = self._negotiate_send(event)
+        if encode is not None and isinstance(event.args, PackedArgs):
+            # Already packed with msgpack, not with the codec of the peer.
+            event.args = unpack_args(event.args.join(), event.args.frames,
+                    self._context)
+        frames = None
+        threshold = self._context.oob_threshold
+        use_frames = any((threshold is not None,
+                self._context.ext_types_registered,
+                isinstance(event.args, PackedArgs)))
+        if encode is None and use_frames:
+            frames = []
+            if threshold is not None:
+                args = _extract_frames(event.args, threshold, frames)
+                if frames:
+                    encode = lambda _: args  # noqa
+        compress_args = None
+        if self._context.compress_threshold is not None:
+            compress_args = self._compress
         if self._debug:
             logger.debug('--> %s', event)
+        self._packing_frames = frames
+        try:
+            blob = event.pack(self._packer, encode, frames, compact,
+                    compress_args)
+        finally:
+            self._packing_frames = None
+        frames = frames or []
+        frames.reverse()
+        frames.append(blob)
         if event.identity:
             parts = list(event.identity or list())
-            parts.extend([b'', event.pack()])
+            parts.append(b'')
+            parts.extend(frames)
+        elif self._zmq_socket_type in (zmq.DEALER, zmq.ROUTER):
+            parts = [b'']
+            parts.extend(frames)
+        else:
+            parts = frames
+        priority = event.name in _CONTROL_EVENTS
+        peer_key = self._peer_key(event.identity)
+        peer = self._peers.get(peer_key)
+        bundling = self._context.bundle_events and peer is not None \
+            and peer.bundle
+        if not priority and (self._bundles or self._context.bundle_events):
+            if bundling and len(frames) == 1 \
+                    and len(blob) < self._context.bundle_size:
+                self._bundle(peer_key, parts[:-1], blob)
+                return
+            # Events are sent in order.
+            self._flush_bundle(peer_key, timeout=timeout)
+        # Each channel is a queue of the fair scheduling of the sender, but a
+        # bundle mixes the channels of its peer.
+        if bundling:
+            key = peer_key
         elif self._zmq_socket_type in (zmq.DEALER, zmq.ROUTER):
-            parts = (b'', event.pack())
+            key = (peer_key, event.header.get(u'response_to',
+                event.header.get(u'message_id')))
         else:
-            parts = (event.pack(),)
-        self._send(parts, timeout)
+            key = None
+        fragment_size = self._context.fragment_size
+        if fragment_size is not None and not priority and peer is not None \
+                and peer.frag \
+                and sum(_nbytes(f) for f in frames) > fragment_size:
+            self._send_fragments(parts[:-len(frames)], frames, key, timeout)
+            return
+        self._send(parts, timeout, priority, key)
+
+    def _send_fragments(self, prefix, frames, key, timeout):
+        # Each fragment is a _zpc_frag event followed by a piece of the
+        # frames of the event, as an out-of-band frame. The first fragment
+        # gives the sizes of the frames.
+        self._fragment_id += 1
+        fragment_id = self._fragment_id
+        views = [_byte_view(frame) for frame in frames]
+        args = [fragment_id, [len(view) for view in views]]
+        size = self._context.fragment_size
+        for view in views:
+            for offset in range(0, len(view), size):
+                head = Event(u'_zpc_frag', args, None, {u'frames': 1})
+                parts = list(prefix)
+                parts.append(view[offset:offset + size])
+                parts.append(head.pack(self._packer))
+                self._send(parts, timeout, key=key)
+                args = [fragment_id]
+
+    def _bundle(self, key, prefix, blob):
+        bundle = self._bundles.get(key)
+        if bundle is None:
+            bundle = self._bundles[key] = _Bundle(prefix)
+            gevent.spawn_later(self._context.bundle_window, self._flush_bundle,
+                    key, bundle)
+        bundle.blobs.append(blob)
+        bundle.size += len(blob)
+        if bundle.size >= self._context.bundle_size:
+            self._flush_bundle(key)
+
+    def _flush_bundle(self, key, bundle=None, timeout=None):
+        # Called by the timer of a bundle too, which may have been flushed
+        # already.
+        if bundle is None:
+            bundle = self._bundles.get(key)
+            if bundle is None:
+                return
+        elif self._bundles.get(key) is not bundle:
+            return
+        del self._bundles[key]
+        blobs = bundle.blobs
+        if len(blobs) > 1:
+            # The sizes of the events come first, then the events themselves.
+            head = Event(u'_zpc_bundle', [len(b) for b in blobs], None, {})
+            blobs.insert(0, head.pack(self._packer))
+        parts = list(bundle.prefix)
+        parts.append(b''.join(blobs))
+        self._send(parts, timeout, key=key)
 
     def recv(self, timeout=None):
-        parts = self._recv(timeout=timeout)
+        if self._unbundled:
+            event = self._unbundled.popleft()
+        else:
+            event = self._recv_event(timeout)
+        self._negotiate_recv(event)
+        if self._debug:
+            logger.debug('<-- %s', event)
+        return event
+
+    def use_zmtp_heartbeat(self, freq):
+        """Check the connections with ZMTP heartbeats, every freq seconds.
+
+        libzmq sends and checks them in its I/O thread, and closes a
+        connection after two intervals without traffic. The peers are then
+        watched as with Context.monitor_peers, and the channels with the
+        peers which do the same don't need a HeartBeatOnChannel, see
+        zmtp_heartbeat(). Only applies to the connections made afterwards.
+
+        """
+        if self._zmq_socket_type not in (zmq.DEALER, zmq.ROUTER):
+            raise ValueError('ZMTP heartbeats are only used between a DEALER '
+                    'and a ROUTER')
+        ivl = int(freq * 1000)
+        self._socket.setsockopt(zmq.HEARTBEAT_IVL, ivl)
+        self._socket.setsockopt(zmq.HEARTBEAT_TIMEOUT, ivl * 2)
+        self._socket.setsockopt(zmq.HEARTBEAT_TTL, ivl * 2)
+        self._zmtp_heartbeat = True
+        self._watch_peers()
+
+    def zmtp_heartbeat(self, event=None):
+        """Whether the channel opened by event can do without heartbeats,
+        both ends detecting a lost connection, see use_zmtp_heartbeat().
+
+        For a DEALER, the channel it opens next: only as long as it is
+        connected to a single endpoint (or it couldn't tell which one was
+        lost) and the ROUTER said it does ZMTP heartbeats, None when the
+        ROUTER didn't say yet. For a ROUTER, when event says so.
+
+        """
+        if not self._zmtp_heartbeat:
+            return False
+        if self._zmq_socket_type == zmq.ROUTER:
+            return bool(event.header.get(u'zmtp_hb'))
+        if self._endpoints != 1:
+            return False
+        peer = self._peers.get(None)
+        return True if peer is not None and peer.zmtp_hb else None
+
+    def add_lost_peer_handler(self, handler):
+        """Call handler(peer) when the connection of a peer is lost.
+
+        peer is the key of the peer (see _peer_key), None for a DEALER. Only
+        with Context.monitor_peers.
+
+        """
+        self._lost_peer_handlers.append(handler)
+
+    def _watch_peers(self):
+        if self._monitor_task is None and \
+                self._zmq_socket_type in (zmq.DEALER, zmq.ROUTER):
+            self._monitor_task = gevent.spawn(self._monitor,
+                    self._socket.get_monitor_socket(_MONITORED_EVENTS))
+
+    def _monitor(self, socket):
+        try:
+            while True:
+                message = recv_monitor_message(socket)
+                if message[u'event'] == zmq.EVENT_MONITOR_STOPPED:
+                    break
+                self._on_monitor_event(message[u'event'], message[u'value'])
+        finally:
+            socket.close()
+
+    def _on_monitor_event(self, event, value):
+        # A connection failing before it was established loses nothing: the
+        # events wait for the next attempt.
+        if self._zmq_socket_type == zmq.ROUTER:
+            if event in (zmq.EVENT_DISCONNECTED, zmq.EVENT_CLOSED):
+                for key in self._peer_fds.pop(value, ()):
+                    self._lost_peer(key)
+        elif self._endpoints == 1 and event != zmq.EVENT_CLOSED:
+            self._lost_peer(None)
+
+    def _watch_peer(self, frame, identity):
+        # Peers behind a proxy share its connection.
+        fd = frame.get(zmq.SRCFD)
+        keys = self._peer_fds.get(fd)
+        if keys is None:
+            keys = self._peer_fds[fd] = set()
+        keys.add(self._peer_key(identity))
+
+    def _lost_peer(self, key):
+        logger.debug('lost peer %s', key)
+        self._peers.pop(key, None)
+        for handler in self._lost_peer_handlers:
+            handler(key)
+
+    def _recv_event(self, timeout):
+        while True:
+            parts = self._recv(timeout=timeout)
+            event = self._unpack_event(parts)
+            if self._monitor_task is not None and \
+                    self._zmq_socket_type == zmq.ROUTER:
+                self._watch_peer(parts[0], event.identity)
+            if event.name != u'_zpc_frag':
+                return event
+            parts = self._defragment(event, parts[:-2], parts[-2])
+            if parts is not None:
+                return self._unpack_event(parts)
+
+    def _defragment(self, event, prefix, piece):
+        key = (self._peer_key(event.identity), event.args[0])
+        if len(event.args) > 1:
+            if len(self._fragments) >= self.max_peers:
+                self._fragments.pop(next(iter(self._fragments)))
+            fragments = self._fragments[key] = _Fragments(event.args[1])
+        else:
+            fragments = self._fragments.get(key)
+            if fragments is None:
+                logger.warning('zerorpc.Events, dropping the fragment of an '
+                        'unknown event: {0}'.format(event.args[0]))
+                return None
+        frames = fragments.add(_frame_buffer(piece))
+        if frames is None:
+            return None
+        del self._fragments[key]
+        parts = list(prefix)
+        parts.extend(frames)
+        return parts
+
+    def _unpack_event(self, parts):
+        blob = parts[-1]
+        event = Event.unpack(_frame_buffer(blob), self._context,
+                parts[:-1])  # 获取帧的缓冲区谁并反序列化
+        # out-of-band frames sit between the identity and the body.
+        frames_count = event.header.get(u'frames', 0)
+        if frames_count:
+            parts = parts[:-1 - frames_count]
+            parts.append(blob)
         if len(parts) > 2:
             identity = parts[0:-2]  # ['id1','id2',...,'id-n', pack]
-            blob = parts[-1]
         elif len(parts) == 2:
             identity = parts[0:-1]  # ['id', pack] ?
-            blob = parts[-1]
         else:
             identity = None
-            blob = parts[0]
-        event = Event.unpack(get_pyzmq_frame_buffer(blob))  # 获取帧的缓冲区谁并反序列化
         event.identity = identity  # identity 是一个list？
-        if self._debug:
-            logger.debug('<-- %s', event)
+        if event.name == u'_zpc_bundle':
+            view = _frame_buffer(blob)
+            offset = len(view) - sum(event.args)
+            for size in event.args:
+                bundled = Event.unpack(view[offset:offset + size],
+                        self._context)
+                bundled.identity = identity
+                self._unbundled.append(bundled)
+                offset += size
+            event = self._unbundled.popleft()
         return event
 
     def setsockopt(self, *args):
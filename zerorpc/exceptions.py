@@ -36,6 +36,12 @@ class TimeoutExpired(Exception):
         super(TimeoutExpired, self).__init__(msg)
 
 
+class MethodTableMismatch(NameError):
+    """A method called by its id, while the method table of the server
+    isn't the one of the client (see ClientBase(method_ids=True))."""
+    pass
+
+
 class RemoteError(Exception):
 
     def __init__(self, name, human_msg, human_traceback):
@@ -36,9 +36,6 @@ import zmq as _zmq
 import gevent.event
 import gevent.core
 import errno
-from logging import getLogger
-
-logger = getLogger(__name__)
 
 
 class Context(_zmq.Context):
@@ -59,6 +56,9 @@ class Socket(_zmq.Socket):
         # tricks with self.__dict__ here
         self.__dict__["_readable"] = gevent.event.Event()
         self.__dict__["_writable"] = gevent.event.Event()
+        # Number of greenlets blocked in recv() and send() respectively.
+        self.__dict__["_waiting_recv"] = 0
+        self.__dict__["_waiting_send"] = 0
         try:
             # gevent>=1.0
             self.__dict__["_state_event"] = gevent.hub.get_hub().loop.io(
@@ -89,6 +89,28 @@ class Socket(_zmq.Socket):
         if events & _zmq.POLLIN:
             self._readable.set()
 
+    # The zmq FD is edge-triggered: it only signals that ZMQ_EVENTS *may* have
+    # changed, and any send, recv or getsockopt(EVENTS) can consume that
+    # signal while processing the socket's pending commands. After an
+    # operation we therefore re-read ZMQ_EVENTS on behalf of the greenlets
+    # that are waiting, but only when there are some: nobody else relies on
+    # the edge.
+    def _after_operation(self):
+        if self._waiting_recv or self._waiting_send:
+            self._on_state_changed()
+
+    def _wait(self, ready, waiting):
+        ready.clear()
+        self.__dict__[waiting] += 1
+        try:
+            # Our own EAGAIN may have consumed the edge of the other
+            # direction, and a message may have arrived since: look once
+            # before sleeping on the FD.
+            self._on_state_changed()
+            ready.wait()
+        finally:
+            self.__dict__[waiting] -= 1
+
     def close(self):
         if not self.closed and getattr(self, '_state_event', None):
             try:
@@ -109,80 +131,37 @@ class Socket(_zmq.Socket):
 
     def send(self, data, flags=0, copy=True, track=False):
         if flags & _zmq.NOBLOCK:
-            return super(Socket, self).send(data, flags, copy, track)
+            try:
+                return super(Socket, self).send(data, flags, copy, track)
+            finally:
+                if not flags & _zmq.SNDMORE:
+                    # Once per message is enough.
+                    self._after_operation()
         flags |= _zmq.NOBLOCK
         while True:
             try:
                 msg = super(Socket, self).send(data, flags, copy, track)
-                # The following call, force polling the state of the zmq socket
-                # (POLLIN and/or POLLOUT). It seems that a POLLIN event is often
-                # missed when the socket is used to send at the same time,
-                # forcing to poll at this exact moment seems to reduce the
-                # latencies when a POLLIN event is missed. The drawback is a
-                # reduced throughput (roughly 8.3%) in exchange of a normal
-                # concurrency. In other hand, without the following line, you
-                # loose 90% of the performances as soon as there is simultaneous
-                # send and recv on the socket.
-                self._on_state_changed()
+                if not flags & _zmq.SNDMORE:
+                    self._after_operation()
                 return msg
             except _zmq.ZMQError as e:
                 if e.errno not in (_zmq.EAGAIN, errno.EINTR):
                     raise
-            self._writable.clear()
-            # The following sleep(0) force gevent to switch out to another
-            # coroutine and seems to refresh the notion of time that gevent may
-            # have. This definitively eliminate the gevent bug that can trigger
-            # a timeout too soon under heavy load. In theory it will incur more
-            # CPU usage, but in practice it balance even with the extra CPU used
-            # when the timeout triggers too soon in the following loop. So for
-            # the same CPU load, you get a better throughput (roughly 18.75%).
-            gevent.sleep(0)
-            while not self._writable.wait(timeout=1):
-                try:
-                    if self.getsockopt(_zmq.EVENTS) & _zmq.POLLOUT:
-                        logger.error("/!\\ gevent_zeromq BUG /!\\ "
-                                     "catching up after missing event (SEND) /!\\")
-                        break
-                except ZMQError as e:
-                    if e.errno not in (_zmq.EAGAIN, errno.EINTR):
-                        raise
+            self._wait(self._writable, '_waiting_send')
 
     def recv(self, flags=0, copy=True, track=False):
         if flags & _zmq.NOBLOCK:
-            return super(Socket, self).recv(flags, copy, track)
+            try:
+                return super(Socket, self).recv(flags, copy, track)
+            finally:
+                self._after_operation()
         flags |= _zmq.NOBLOCK
         while True:
             try:
                 msg = super(Socket, self).recv(flags, copy, track)
-                # The following call, force polling the state of the zmq socket
-                # (POLLIN and/or POLLOUT). It seems that a POLLOUT event is
-                # often missed when the socket is used to receive at the same
-                # time, forcing to poll at this exact moment seems to reduce the
-                # latencies when a POLLOUT event is missed. The drawback is a
-                # reduced throughput (roughly 8.3%) in exchange of a normal
-                # concurrency. In other hand, without the following line, you
-                # loose 90% of the performances as soon as there is simultaneous
-                # send and recv on the socket.
-                self._on_state_changed()
+                self._after_operation()
                 return msg
             except _zmq.ZMQError as e:
                 if e.errno not in (_zmq.EAGAIN, errno.EINTR):
                     raise
-            self._readable.clear()
-            # The following sleep(0) force gevent to switch out to another
-            # coroutine and seems to refresh the notion of time that gevent may
-            # have. This definitively eliminate the gevent bug that can trigger
-            # a timeout too soon under heavy load. In theory it will incur more
-            # CPU usage, but in practice it balance even with the extra CPU used
-            # when the timeout triggers too soon in the following loop. So for
-            # the same CPU load, you get a better throughput (roughly 18.75%).
-            gevent.sleep(0)
-            while not self._readable.wait(timeout=1):
-                try:
-                    if self.getsockopt(_zmq.EVENTS) & _zmq.POLLIN:
-                        logger.error("/!\\ gevent_zeromq BUG /!\\ "
-                                     "catching up after missing event (RECV) /!\\")
-                        break
-                except ZMQError as e:
-                    if e.errno not in (_zmq.EAGAIN, errno.EINTR):
-                        raise
+            self._wait(self._readable, '_waiting_recv')
@@ -43,6 +43,8 @@ class HeartBeatOnChannel(ChannelBase):
         self._input_queue = gevent.queue.Channel()
         self._remote_last_hb = None   # 最近的心跳时间
         self._lost_remote = False
+        self._lost_remote_reason = None
+        channel.on_lost_remote = self._on_lost_remote
         self._recv_task = gevent.spawn(self._recver)
         self._heartbeat_task = None
         self._parent_coroutine = gevent.getcurrent()  # 返回当前正在执行的greenlet
@@ -83,6 +85,18 @@ class HeartBeatOnChannel(ChannelBase):
                 break
             self._channel.emit(u'_zpc_hb', (0,))  # 0 -> compat with protocol v2
 
+    def _on_lost_remote(self):   # 对端断开, 不等心跳超时
+        if self._lost_remote:
+            return
+        self._lost_remote = True
+        self._lost_remote_reason = 'Lost remote, disconnected'
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.kill(block=False)
+            self._heartbeat_task = None
+        if not self._closed:
+            gevent.kill(self._parent_coroutine,
+                    self._lost_remote_exception())
+
     def _start_heartbeat(self):
         if self._heartbeat_task is None and self._heartbeat_freq is not None and not self._closed:
             self._heartbeat_task = gevent.spawn(self._heartbeat)
@@ -102,6 +116,8 @@ class HeartBeatOnChannel(ChannelBase):
                 self._input_queue.put(event)          # 不是心跳帧 放到 self._input_queue
 
     def _lost_remote_exception(self):
+        if self._lost_remote_reason is not None:
+            return LostRemote(self._lost_remote_reason)
         return LostRemote('Lost remote after {0}s heartbeat'.format(
             self._heartbeat_freq * 2))
 
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import absolute_import
+
+import gevent.queue
+
+from .channel_base import ChannelBase
+from .events import Event, PackedArgs, unpack_args
+from .exceptions import LostRemote, TimeoutExpired
+
+
+class LocalEvents(ChannelBase):
+    """Events between a Server and its Clients of the same process, see
+    Context.local_calls.
+
+    The events are handed over as they are, through gevent queues: nothing is
+    serialized and zmq isn't involved. On the server side (server is None),
+    the identity of an event is the LocalEvents of the client it comes from.
+    """
+
+    def __init__(self, context, server=None):
+        self._context = context
+        self._server = server
+        self._queue = gevent.queue.Queue()
+        self._clients = set()
+        self._lost_peer_handlers = []
+        self._closed = False
+        if server is not None:
+            server._clients.add(self)
+
+    @property
+    def recv_is_supported(self):
+        return True
+
+    @property
+    def emit_is_supported(self):
+        return True
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._server is not None:
+            self._server._clients.discard(self)
+            self._server._lost_peer(self)
+        for client in list(self._clients):
+            client._lost_peer(None)
+        self._clients.clear()
+
+    def new_event(self, name, args, xheader=None):
+        event = Event(name, args, context=self._context)
+        if xheader:
+            event.header.update(xheader)
+        return event
+
+    def emit_event(self, event, timeout=None):
+        if self._server is not None:
+            peer = self._server
+            if peer._closed:
+                raise LostRemote('Lost remote, server closed')
+        else:
+            peer = event.identity
+            if peer not in self._clients:
+                return    # gone, like a ROUTER drops what it can't route
+        args = event.args
+        if isinstance(args, PackedArgs):
+            args = unpack_args(args.join(), args.frames, self._context)
+        # A copy, the sender is free to reuse its event. There is nothing to
+        # reassemble locally, the results aren't sent in chunks.
+        header = dict(event.header)
+        header.pop(u'chunked', None)
+        copy = Event(event.name, args, None, header)
+        copy.identity = self if self._server is not None else None
+        peer._queue.put(copy)
+
+    def recv(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except gevent.queue.Empty:
+            raise TimeoutExpired(timeout)
+
+    def zmtp_heartbeat(self, event=None):
+        # There is no connection to check: the peer is lost when closed.
+        return True
+
+    def add_lost_peer_handler(self, handler):
+        self._lost_peer_handlers.append(handler)
+
+    def _peer_key(self, identity):
+        return identity
+
+    def _lost_peer(self, key):
+        for handler in self._lost_peer_handlers:
+            handler(key)
+
+    @property
+    def context(self):
+        return self._context
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import absolute_import
+
+import msgpack
+
+try:
+    import numpy
+    from numpy.lib.format import dtype_to_descr, descr_to_dtype
+except ImportError:
+    numpy = None
+
+# msgpack ext type code of numpy.ndarray, see register_ndarray().
+EXT_NDARRAY = 2
+
+
+def _encode_ndarray(array, attach):
+    if array.dtype.hasobject:
+        raise TypeError('can not serialize ndarray of Python objects')
+    shape = array.shape
+    # Only a non-contiguous array is copied, to lay it out in a single buffer.
+    array = numpy.ascontiguousarray(array)
+    index = attach(array.reshape(-1).view(numpy.uint8).data)
+    return msgpack.packb((dtype_to_descr(array.dtype), shape, index),
+            use_bin_type=True)
+
+
+def _as_descr(descr):
+    # msgpack turns the tuples of a structured dtype descr into lists.
+    if not isinstance(descr, list):
+        return descr
+    fields = []
+    for field in descr:
+        field = list(field)
+        field[1] = _as_descr(field[1])
+        if len(field) > 2:
+            field[2] = tuple(field[2])
+        fields.append(tuple(field))
+    return fields
+
+
+def _decode_ndarray(data, frame):
+    (descr, shape, index) = msgpack.unpackb(data, raw=False)
+    dtype = descr_to_dtype(_as_descr(descr))
+    return numpy.frombuffer(frame(index), dtype=dtype).reshape(tuple(shape))
+
+
+def register_ndarray(context, code=EXT_NDARRAY):
+    """Send numpy.ndarray objects through context without copying them.
+
+    The dtype and shape of an array are packed inline while its buffer goes
+    in an out-of-band frame. The remote rebuilds a read-only array over the
+    received frame with numpy.frombuffer. Both ends must register it.
+
+    """
+    if numpy is None:
+        raise ImportError('numpy is required to register the ndarray ext type')
+    context.register_ext_type(code, numpy.ndarray, _encode_ndarray,
+            _decode_ndarray)
@@ -23,22 +23,140 @@
 # SOFTWARE.
 
 
+import msgpack
+
+from .events import (Event, PackedArgs, new_packer, new_unpacker, pack_args,
+        unpack_args)
+from .results import LazyList, RawResult
+
+# The msgpack header of an array of one item, the args of an OK event.
+_ONE_ITEM = b'\x91'
+
+
 class ReqRep(object):
 
     def process_call(self, context, channel, req_event, functor):
         context.hook_server_before_exec(req_event)               # 执行 server_before_exec 钩子
         result = functor(*req_event.args)                        # 执行 task 函数
+        # A None chunk_size disables chunked responses.
+        chunked = req_event.header.get(u'chunked') and context.chunk_size
+        if isinstance(result, LazyList) and not chunked:
+            result = list(result)
         rep_event = channel.new_event(u'OK', (result,),          # 创建一个新的 event 
                 context.hook_get_task_context())                 # 执行 get_task_context 钩子
         context.hook_server_after_exec(req_event, rep_event)     # 执行 server_after_exec 钩子
+        if isinstance(result, LazyList):
+            self._emit_lazy(context, channel, rep_event, result)
+        elif chunked:
+            self._emit_chunked(context, channel, rep_event)
+        else:
+            if isinstance(result, RawResult):
+                rep_event.args = PackedArgs(result.packed, prefix=_ONE_ITEM)
+            channel.emit_event(rep_event)
+
+    def _emit_chunked(self, context, channel, rep_event):
+        # The result is packed once, and sent as is when small enough.
+        # Otherwise a CHUNKS event announces the size of the transfer, and the
+        # CHUNK events carrying its slices are flow controlled by the
+        # BufferedChannel like a stream, other channels keep moving meanwhile.
+        (result,) = rep_event.args
+        if isinstance(result, RawResult):
+            packed_args = PackedArgs(result.packed, prefix=_ONE_ITEM)
+        else:
+            packed_args = PackedArgs(*pack_args(rep_event.args, context))
+        chunk_size = context.chunk_size
+        frames = [memoryview(f) for f in packed_args.frames]
+        segments = [memoryview(packed_args.prefix),
+                memoryview(packed_args.blob)] + frames
+        size = sum(len(segment) for segment in segments)
+        if size <= chunk_size:
+            rep_event.args = packed_args
+            channel.emit_event(rep_event)
+            return
+        rep_event.name = u'CHUNKS'
+        rep_event.args = (size, [len(frame) for frame in frames])
         channel.emit_event(rep_event)
+        for segment in segments:
+            for offset in range(0, len(segment), chunk_size):
+                channel.emit(u'CHUNK', (segment[offset:offset + chunk_size],))
+
+    def _emit_lazy(self, context, channel, rep_event, items):
+        # The size of the transfer isn't known upfront, the items are encoded
+        # as they are produced and the client decodes them as they come.
+        packer = new_packer(context)
+        chunk_size = context.chunk_size
+        rep_event.name = u'CHUNKS'
+        rep_event.args = (None, [])
+        channel.emit_event(rep_event)
+        parts = [b'\x91', packer.pack_array_header(len(items))]
+        size = 0
+        for item in items:
+            part = packer.pack(item)
+            parts.append(part)
+            size += len(part)
+            if size >= chunk_size:
+                channel.emit(u'CHUNK', (b''.join(parts),))
+                parts = []
+                size = 0
+        if parts:
+            channel.emit(u'CHUNK', (b''.join(parts),))
+
+    def _recv_chunk(self, channel):
+        event = channel.recv()
+        if event.name not in (u'CHUNK', u'ERR'):
+            raise RuntimeError('unexpected event while receiving '
+                'chunks: {0}'.format(event))
+        return event
+
+    def _recv_lazy(self, context, channel, rep_event):
+        unpacker = new_unpacker(context)
+        items = []
+        length = None
+        while length is None or len(items) < length:
+            event = self._recv_chunk(channel)
+            if event.name == u'ERR':
+                return event
+            unpacker.feed(event.args[0])
+            if length is None:
+                unpacker.read_array_header()
+                length = unpacker.read_array_header()
+            try:
+                while len(items) < length:
+                    items.append(unpacker.unpack())
+            except msgpack.OutOfData:
+                pass
+        return Event(u'OK', [items], context, rep_event.header)
+
+    def _recv_chunked(self, context, channel, rep_event):
+        (size, frames_sizes) = rep_event.args
+        if size is None:
+            return self._recv_lazy(context, channel, rep_event)
+        buf = bytearray(size)
+        view = memoryview(buf)
+        received = 0
+        while received < size:
+            event = self._recv_chunk(channel)
+            if event.name == u'ERR':
+                return event
+            chunk = event.args[0]
+            view[received:received + len(chunk)] = chunk
+            received += len(chunk)
+        frames = []
+        end = size
+        for frame_size in reversed(frames_sizes):
+            frames.insert(0, view[end - frame_size:end])
+            end -= frame_size
+        args = unpack_args(view[:end], frames, context)
+        return Event(u'OK', args, context, rep_event.header)
 
     def accept_answer(self, event):
-        return event.name in (u'OK', u'ERR')
+        return event.name in (u'OK', u'ERR', u'CHUNKS')
 
     def process_answer(self, context, channel, req_event, rep_event,       # 客户端接收结果
             handle_remote_error):
         try:
+            if rep_event.name == u'CHUNKS':
+                rep_event = self._recv_chunked(context, channel, rep_event)
             if rep_event.name == u'ERR':
                 exception = handle_remote_error(rep_event)
                 context.hook_client_after_request(req_event, rep_event, exception)
@@ -55,6 +173,8 @@ class ReqStream(object):
         context.hook_server_before_exec(req_event)
         xheader = context.hook_get_task_context()
         for result in iter(functor(*req_event.args)):
+            if isinstance(result, RawResult):
+                result = PackedArgs(result.packed)
             channel.emit(u'STREAM', result, xheader)
         done_event = channel.new_event(u'STREAM_DONE', None, xheader)
         # NOTE: "We" made the choice to call the hook once the stream is done,
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Open Source Initiative OSI - The MIT License (MIT):Licensing
+#
+# The MIT License (MIT)
+# Copyright (c) 2015 François-Xavier Bourlet (bombela+zerorpc@gmail.com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+class LazyList(object):
+    """A list produced while it is sent, as the result of a call.
+
+    Returned by a method, the items of iterable are encoded as they are
+    produced and sent in chunks (see Context.chunk_size): the server never
+    holds the whole list, nor its encoding. The client receives an ordinary
+    list of length items.
+
+    The items can't be ext types attaching out-of-band buffers (like numpy
+    arrays). Clients not supporting chunked responses get the list built in
+    full.
+
+    """
+
+    def __init__(self, iterable, length):
+        self._iterable = iterable
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        count = 0
+        for item in self._iterable:
+            if count == self._length:
+                raise ValueError('LazyList got more than {0} items'.format(
+                    self._length))
+            count += 1
+            yield item
+        if count != self._length:
+            raise ValueError('LazyList got {0} items instead of {1}'.format(
+                count, self._length))
+
+
+class RawResult(object):
+    """A result already encoded with msgpack, sent as is.
+
+    packed is the msgpack encoding of the result, for instance of a snapshot
+    returned by many calls: msgpack.packb(snapshot, use_bin_type=True). It is
+    spliced in the response without any serialization work. A RawResult can
+    also be yielded as an item of a stream.
+
+    """
+
+    __slots__ = ['packed']
+
+    def __init__(self, packed):
+        self.packed = packed
@@ -23,15 +23,23 @@
 # SOFTWARE.
 
 
-from .context import Context
+from .context import Context, _normalize_socket_options
 from .events import Events
 
 
 class SocketBase(object):
 
-    def __init__(self, zmq_socket_type, context=None):
+    def __init__(self, zmq_socket_type, context=None, socket_options=None):
         self._context = context or Context.get_instance()   # socket 上下文 hook
-        self._events = Events(zmq_socket_type, context)     # socket 事件，监听、发送
+        # See Context.socket_options, these apply on top of the context's.
+        self._socket_options = _normalize_socket_options(socket_options)
+        self._events = self._new_events(zmq_socket_type)    # socket 事件，监听、发送
+
+    def _new_events(self, zmq_socket_type):
+        events = Events(zmq_socket_type, self._context)
+        for option, value in self._socket_options:
+            events.setsockopt(option, value)
+        return events
 
     def close(self):
         self._events.close()